@@ -5,3 +5,7 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'API'
+
+    def ready(self):
+        from api import (  # noqa: F401
+            authentication, cache, feed, images, search)
@@ -0,0 +1,173 @@
+import copy
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from foodgram.constants import (
+    AUTH_CACHE_SIZE,
+    AUTH_CACHE_STATS_INTERVAL,
+    AUTH_CACHE_TTL,
+)
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """LRU-кэш «токен → Пользователь» в памяти процесса.
+
+    Размер ограничен AUTH_CACHE_SIZE записями, запись живет не дольше
+    AUTH_CACHE_TTL секунд. Вместе с записью хранится поколение токена
+    из общего кэша Django: запись принимается, только пока поколение
+    не изменилось, поэтому отзыв токена в любом процессе действует
+    во всех процессах со следующего запроса.
+    """
+
+    def __init__(self, size=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """(Пользователь, токен, поколение) или None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            lookups = self.hits + self.misses
+        if lookups % AUTH_CACHE_STATS_INTERVAL == 0:
+            logger.info('Кэш токенов: %s', self.stats())
+        return None if entry is None else entry[1:]
+
+    def set(self, key, user, token, generation):
+        with self._lock:
+            self._entries[key] = (
+                time.monotonic() + self.ttl, user, token, generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in [
+                key for key, (_, user, _, _) in self._entries.items()
+                if user.id == user_id
+            ]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'size': len(self._entries),
+            }
+
+
+token_cache = TokenCache()
+
+
+def generation_key(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'auth_token_generation:{digest}'
+
+
+def get_generation(key):
+    """Поколение токена в общем кэше; создается при первом обращении."""
+    cache_key = generation_key(key)
+    generation = cache.get(cache_key)
+    if generation is None:
+        cache.add(cache_key, time.time(), None)
+        generation = cache.get(cache_key)
+    return generation
+
+
+def revoke_tokens(keys):
+    """Отзывает токены из кэшей всех процессов.
+
+    Поколение меняется после фиксации транзакции: запрос, прочитавший
+    токен из БД до нее, сохранит запись со старым поколением.
+    """
+    keys = list(keys)
+    for key in keys:
+        token_cache.delete(key)
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(
+            {generation_key(key): time.time() for key in keys}, None))
+
+
+def revoke_user_tokens(user_id):
+    token_cache.delete_user(user_id)
+    revoke_tokens(Token.objects.filter(
+        user_id=user_id).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД для недавно виденных токенов.
+
+    Поколение читается до запроса к БД, поэтому отзыв токена
+    во время запроса не оставит его в кэше.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            user, token, generation = cached
+            if cache.get(generation_key(key)) != generation:
+                token_cache.delete(key)
+                cached = None
+        if cached is None:
+            generation = get_generation(key)
+            user, token = super().authenticate_credentials(key)
+            if generation is not None:
+                token_cache.set(key, user, token, generation)
+        elif not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return copy.copy(user), token
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    revoke_tokens((instance.key,))
+
+
+@receiver(user_logged_out)
+def invalidate_logged_out_user(user, **kwargs):
+    if user is not None:
+        revoke_user_tokens(user.id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, update_fields=None, **kwargs):
+    """Отзывает токены Пользователя при изменении его данных,
+    в том числе пароля и признака активности."""
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    revoke_user_tokens(instance.id)
@@ -0,0 +1,165 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+from foodgram.constants import REFERENCE_CACHE_TIMEOUT
+from foodgram.routers import read_primary
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def version_key(model):
+    return f'reference_version:{model._meta.label_lower}'
+
+
+def get_version(model):
+    """Версия данных модели: время последнего изменения."""
+    key = version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key, time.time())
+    return version
+
+
+def bump_version(model):
+    cache.set(version_key(model), time.time(), None)
+
+
+def recipe_versions():
+    """Версии Тегов и Ингредиентов, прочитанные одним обращением к кэшу."""
+    keys = {model: version_key(model) for model in (Tag, Ingredient)}
+    versions = cache.get_many(keys.values())
+    return tuple(
+        versions[key] if key in versions else get_version(model)
+        for model, key in keys.items()
+    )
+
+
+def recipe_cache_key(recipe_id, versions=None):
+    """Ключ кэша общего для всех пользователей представления Рецепта.
+
+    Содержит версии Тегов и Ингредиентов, поэтому их изменение
+    делает недействительными все сохраненные представления.
+    Для страницы Рецептов версии читаются один раз и передаются
+    в versions.
+    """
+    tag_version, ingredient_version = versions or recipe_versions()
+    return f'recipe:{recipe_id}:{tag_version}:{ingredient_version}'
+
+
+def invalidate_recipes(recipe_ids):
+    """Удаляет представления Рецептов из кэша после фиксации транзакции.
+
+    Иначе параллельный запрос успел бы снова сохранить в кэш
+    еще не измененные данные.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    def delete():
+        versions = recipe_versions()
+        cache.delete_many(
+            [recipe_cache_key(pk, versions) for pk in recipe_ids])
+
+    transaction.on_commit(delete)
+
+
+class CachedReferenceMixin:
+    """Кэширует ответы list и retrieve справочных ViewSet.
+
+    Ключ кэша содержит версию модели, которая меняется при сохранении
+    и удалении объектов; кэш заполняется данными основной БД. Ответы
+    снабжаются ETag, повторный запрос с совпадающим If-None-Match
+    получает 304. Last-Modified не отдается: его точность в секунду
+    не различает два изменения за одну секунду.
+    """
+
+    def cached_response(self, request, view, *args, **kwargs):
+        model = self.get_queryset().model
+        version = get_version(model)
+        path = request.get_full_path()
+        etag = quote_etag(hashlib.md5(
+            f'{version}:{path}'.encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            key = f'reference:{model._meta.label_lower}:{version}:{path}'
+            data = cache.get(key)
+            if data is None:
+                with read_primary():
+                    data = view(request, *args, **kwargs).data
+                cache.set(key, data, REFERENCE_CACHE_TIMEOUT)
+            response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_reference_cache(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    """Сбрасывает представление Рецепта.
+
+    Ингредиенты Рецепта меняются вместе с сохранением самого Рецепта,
+    поэтому отдельных обработчиков для них нет: удаление ингредиентов
+    выполняется одним запросом без выборки строк.
+    """
+    invalidate_recipes((instance.id,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_recipes((instance.id,))
+    elif pk_set:
+        invalidate_recipes(pk_set)
+    else:
+        transaction.on_commit(lambda: bump_version(Tag))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    invalidate_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Кэш в памяти процесса не сбрасывается в других воркерах."""
+    backend = settings.CACHES['default']['BACKEND']
+    if backend.endswith('.LocMemCache'):
+        return [checks.Warning(
+            'Кэш по умолчанию хранится в памяти процесса: изменения '
+            'Рецептов и справочников не сбросят его в других воркерах.',
+            hint='Укажите в CACHE_BACKEND общий для процессов кэш.',
+            id='api.W001',
+        )]
+    return []
@@ -0,0 +1,107 @@
+import logging
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connections, transaction
+
+from foodgram.constants import (
+    FEED_BACKFILL_SIZE,
+    FEED_BATCH_SIZE,
+    FEED_SYNC_FOLLOWERS,
+)
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription
+from .images import get_executor, repair_on_start
+
+logger = logging.getLogger(__name__)
+
+
+def fan_out(recipes):
+    """Добавляет Рецепты в ленты подписчиков их авторов пачками."""
+    by_author = defaultdict(list)
+    for recipe in recipes:
+        by_author[recipe.author_id].append(recipe)
+    followers = Subscription.objects.filter(
+        author_id__in=by_author).values_list(
+        'author_id', 'user_id').iterator(chunk_size=FEED_BATCH_SIZE)
+    while True:
+        batch = list(islice(followers, FEED_BATCH_SIZE))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create([
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe.id,
+                pub_date=recipe.pub_date)
+            for author_id, user_id in batch
+            for recipe in by_author[author_id]
+        ], ignore_conflicts=True)
+
+
+def fan_out_pending(recipe_ids=None):
+    """Рассылает Рецепты, отмеченные feed_pending, и снимает отметку."""
+    recipes = Recipe.objects.filter(feed_pending=True).only(
+        'id', 'author_id', 'pub_date')
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    count = 0
+    for recipe in recipes.iterator():
+        fan_out((recipe,))
+        Recipe.objects.filter(pk=recipe.pk).update(feed_pending=False)
+        count += 1
+    return count
+
+
+def run_fan_out(recipe_id):
+    """Рассылка Рецепта в ленты из фонового пула."""
+    try:
+        fan_out_pending((recipe_id,))
+    except Exception:
+        logger.exception('Не удалось разослать рецепт %s в ленты', recipe_id)
+    finally:
+        connections.close_all()
+
+
+@repair_on_start
+def repair_fan_out():
+    """Рассылает Рецепты, фоновая рассылка которых не была завершена."""
+    try:
+        fan_out_pending()
+    except Exception:
+        logger.exception('Не удалось повторить рассылку рецептов в ленты')
+    finally:
+        connections.close_all()
+
+
+def publish(recipe):
+    """Рассылает новый Рецепт в ленты подписчиков автора.
+
+    Ленты небольшого числа подписчиков заполняются в той же транзакции,
+    ленты подписчиков популярного автора - в фоновом пуле после коммита.
+    До конца фоновой рассылки Рецепт отмечен feed_pending, поэтому
+    потерянную при перезапуске процесса рассылку повторяет
+    repair_fan_out.
+    """
+    if recipe.author.followers_count <= FEED_SYNC_FOLLOWERS:
+        fan_out((recipe,))
+        return
+    recipe.feed_pending = True
+    Recipe.objects.filter(pk=recipe.pk).update(feed_pending=True)
+    recipe_id = recipe.id
+    transaction.on_commit(
+        lambda: get_executor().submit(run_fan_out, recipe_id))
+
+
+def backfill(user, author):
+    """Добавляет в ленту последние Рецепты автора при подписке."""
+    latest = Recipe.objects.filter(author=author).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')
+    FeedEntry.objects.bulk_create([
+        FeedEntry(user=user, recipe_id=recipe_id, pub_date=pub_date)
+        for recipe_id, pub_date in latest[:FEED_BACKFILL_SIZE]
+    ], ignore_conflicts=True)
+
+
+def trim(user, author):
+    """Убирает из ленты Рецепты автора при отписке."""
+    FeedEntry.objects.filter(user=user, recipe__author=author).delete()
@@ -1,12 +1,40 @@
+from django.db.models import Case, IntegerField, Value, When
 from django_filters.rest_framework import filters, FilterSet
 from rest_framework.filters import SearchFilter
+
+from foodgram.constants import INGREDIENT_SEARCH_LIMIT
 from recipes.models import Recipe, Tag
+from .search import ingredient_index, match_ingredients, search_recipes
 
 
 class IngredientFilter(SearchFilter):
-    """Поиск по названию Ингредиента."""
+    """Поиск по названию Ингредиента через индекс в памяти.
+
+    Применяется только к списку; найденные Ингредиенты выбираются
+    по первичному ключу в порядке индекса: сначала совпадения
+    по началу названия.
+    """
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if getattr(view, 'action', None) != 'list' or not query.strip():
+            return queryset
+        ids = [
+            ingredient.id for ingredient in ingredient_index.search(
+                query, INGREDIENT_SEARCH_LIMIT)
+        ]
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).order_by(Case(
+            *[When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ids)],
+            output_field=IntegerField()))
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Список чисел через запятую."""
+
 
 class RecipeFilter(FilterSet):
     """Фильтр по полю is_favorited и is_in_shopping_cart."""
@@ -18,6 +46,10 @@ class RecipeFilter(FilterSet):
         method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(
+        method='filter_search')
+    ingredients = NumberInFilter(
+        method='filter_ingredients')
 
     class Meta:
         model = Recipe
@@ -29,11 +61,23 @@ class RecipeFilter(FilterSet):
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
-            return queryset.filter(favorites_recipe__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
-            return queryset.filter(recipes_in_cart__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value)
+        return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        """Рецепты из имеющихся ингредиентов: ?ingredients=1,2,3."""
+        if value:
+            return match_ingredients(
+                queryset, [int(ingredient_id) for ingredient_id in value])
         return queryset
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.signals import request_started
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from foodgram.constants import (
+    IMAGE_VARIANT_FORMAT,
+    IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANTS,
+    IMAGE_WORKERS,
+)
+from recipes.models import Recipe
+from .cache import invalidate_recipes
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/images/variants/'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Общий для процесса пул фоновых задач: обработка фото, рассылка
+    Рецептов в ленты."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                thread_name_prefix='background')
+        return _executor
+
+
+def repair_on_start(task):
+    """Выполняет task в фоновом пуле при первом запросе процесса.
+
+    Очередь пула живет в памяти процесса и теряется при перезапуске;
+    task повторяет потерянные задачи по состоянию БД. Отключается
+    настройкой BACKGROUND_REPAIR.
+    """
+    lock = threading.Lock()
+
+    def start(**kwargs):
+        if not settings.BACKGROUND_REPAIR:
+            return
+        with lock:
+            if not request_started.disconnect(start):
+                return
+        get_executor().submit(task)
+
+    request_started.connect(start, weak=False)
+    return task
+
+
+def render_variants(name):
+    """Создает уменьшенные копии фото и возвращает их имена в хранилище."""
+    with default_storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    stem = os.path.splitext(os.path.basename(name))[0]
+    extension = IMAGE_VARIANT_FORMAT.lower()
+    variants = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size)
+        buffer = BytesIO()
+        resized.save(
+            buffer, IMAGE_VARIANT_FORMAT, quality=IMAGE_VARIANT_QUALITY)
+        variants[variant] = default_storage.save(
+            f'{VARIANTS_DIR}{stem}_{variant}.{extension}',
+            ContentFile(buffer.getvalue()))
+    return variants
+
+
+def build_variants(recipe_id, name, force=False):
+    """Сохраняет уменьшенные копии фото Рецепта, если фото не сменилось.
+
+    Копии того же файла, уже сделанные для другого Рецепта,
+    используются повторно, если не передан force.
+    """
+    try:
+        variants = None
+        if not force:
+            variants = Recipe.objects.filter(image=name).exclude(
+                pk=recipe_id).exclude(image_variants={}).values_list(
+                'image_variants', flat=True).first()
+        variants = variants or render_variants(name)
+        if Recipe.objects.filter(pk=recipe_id, image=name).update(
+                image_variants=variants):
+            invalidate_recipes((recipe_id,))
+    except Exception:
+        logger.exception('Не удалось обработать фото %s', name)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe):
+    """Ставит обработку фото Рецепта в фоновый пул после коммита."""
+    if not recipe.image:
+        return
+    recipe_id, name = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(build_variants, recipe_id, name))
+
+
+def pending_variants():
+    """Рецепты, у фото которых нет уменьшенных копий: (id, имя файла)."""
+    return Recipe.objects.exclude(image='').exclude(image=None).filter(
+        image_variants={}).values_list('id', 'image')
+
+
+@repair_on_start
+def repair_variants():
+    """Создает копии фото, обработка которых не была завершена."""
+    for recipe_id, name in list(pending_variants()):
+        build_variants(recipe_id, name)
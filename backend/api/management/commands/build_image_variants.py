@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api.images import build_variants, pending_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Command for building resized variants of recipe images; '
+            'without --all repeats the jobs lost on restart')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии и для Рецептов, у которых они уже есть.'
+        )
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        if options['all']:
+            recipes = Recipe.objects.exclude(image='').exclude(
+                image=None).values_list('id', 'image')
+        else:
+            recipes = pending_variants()
+        recipes = list(recipes)
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for recipe_id, name in recipes:
+                pool.submit(
+                    build_variants, recipe_id, name, options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано фото: {len(recipes)}.'))
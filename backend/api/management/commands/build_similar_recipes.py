@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from api.recommendations import RecipeSimilarity
+from foodgram.constants import SIMILAR_BATCH_SIZE, SIMILAR_RECIPES_COUNT
+from recipes.models import Recipe, SimilarRecipe
+
+
+class Command(BaseCommand):
+    help = 'Command for precomputing similar recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все Рецепты, а не только изменившиеся.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=SIMILAR_BATCH_SIZE)
+
+    @staticmethod
+    def affected(changed):
+        """Изменившиеся Рецепты и их соседи.
+
+        Соседи - Рецепты, в списках которых есть изменившийся Рецепт,
+        и кандидаты в похожие на него, в списки которых он может попасть.
+        """
+        similarity = RecipeSimilarity(changed)
+        affected = set(changed)
+        affected.update(SimilarRecipe.objects.filter(
+            similar_id__in=changed).values_list('recipe_id', flat=True))
+        for recipe_id in changed:
+            affected.update(similarity.candidates(recipe_id)[0])
+        return affected
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.all()
+        if not options['all']:
+            recipes = recipes.filter(
+                Q(similar_computed_at__isnull=True)
+                | Q(interactions_changed_at__gt=F('similar_computed_at'))
+                | Q(features_changed_at__gt=F('similar_computed_at')))
+        ids = list(recipes.order_by('id').values_list('id', flat=True))
+        if not ids:
+            self.stdout.write(self.style.SUCCESS(
+                'Похожие рецепты актуальны.'))
+            return
+        similarity = None
+        if options['all']:
+            similarity = RecipeSimilarity()
+        else:
+            ids = sorted(set().union(*(
+                self.affected(ids[start:start + batch_size])
+                for start in range(0, len(ids), batch_size))))
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            batch_similarity = similarity or RecipeSimilarity(batch)
+            rows = [
+                SimilarRecipe(recipe_id=recipe_id, similar_id=other,
+                              score=score)
+                for recipe_id in batch
+                for score, other in batch_similarity.neighbours(
+                    recipe_id, SIMILAR_RECIPES_COUNT)
+            ]
+            with transaction.atomic():
+                SimilarRecipe.objects.filter(recipe_id__in=batch).delete()
+                SimilarRecipe.objects.bulk_create(rows)
+                Recipe.objects.filter(pk__in=batch).update(
+                    similar_computed_at=started)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны похожие рецепты для {len(ids)} рецептов.'))
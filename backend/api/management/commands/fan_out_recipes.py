@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.feed import fan_out, fan_out_pending
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Command for repeating the feed fan-out of recipes '
+            'whose background fan-out did not finish')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int,
+            help='Разослать заново и Рецепты, опубликованные '
+                 'за последние часы.'
+        )
+
+    def handle(self, *args, **options):
+        count = fan_out_pending()
+        if options['hours']:
+            since = timezone.now() - timedelta(hours=options['hours'])
+            recipes = Recipe.objects.filter(pub_date__gte=since).only(
+                'id', 'author_id', 'pub_date')
+            for recipe in recipes.iterator():
+                fan_out((recipe,))
+                count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Разослано в ленты рецептов: {count}.'))
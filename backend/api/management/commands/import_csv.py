@@ -1,43 +1,115 @@
 import csv
-
+import io
+import json
 import os
+from itertools import islice
+
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_version
 from recipes.models import Ingredient
 
+BATCH_SIZE = 1000
+
+
+def read_csv(file):
+    for name, measurement_unit in csv.reader(file):
+        yield name, measurement_unit
+
+
+def read_json(file):
+    for ingredient in json.load(file):
+        yield ingredient['name'], ingredient['measurement_unit']
+
 
 class Command(BaseCommand):
-    help = 'Command for importing data from a CSV file'
+    help = 'Command for importing ingredients from a CSV or JSON file'
 
     def add_arguments(self, parser):
         parser.add_argument(
-            'csv_path', type=str, nargs='?', default='data/ingredients.csv'
+            'path', type=str, nargs='?', default='data/ingredients.csv'
         )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
 
-    def handle(self, *args, **options):
-        csv_path = os.path.join(settings.BASE_DIR, options['csv_path'])
-        with open(csv_path, encoding='utf-8') as csv_file:
-            reader = csv.reader(csv_file)
+    def import_copy(self, rows, batch_size):
+        """Импорт через COPY во временную таблицу и INSERT ON CONFLICT.
+
+        Строки копируются пачками по batch_size, поэтому в памяти
+        одновременно находится только одна пачка.
+        """
+        table = Ingredient._meta.db_table
+        created = total = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name text, measurement_unit text) ON COMMIT DROP')
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)', buffer)
+                cursor.execute(
+                    f'INSERT INTO {table} (name, measurement_unit) '
+                    f'SELECT DISTINCT name, measurement_unit '
+                    f'FROM ingredient_import '
+                    f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+                created += cursor.rowcount
+                total += len(batch)
+                cursor.execute('TRUNCATE ingredient_import')
+        return created, total - created
+
+    def import_batches(self, rows, batch_size):
+        """Импорт пачками через bulk_create с пропуском существующих."""
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit'))
+        created = existing_count = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
             new_objects = []
-            existing_count = 0
-            for name, measurement_unit in reader:
-                if not Ingredient.objects.filter(
-                        name=name,
-                        measurement_unit=measurement_unit).exists():
-                    new_objects.append(Ingredient(
-                        name=name,
-                        measurement_unit=measurement_unit))
-                else:
+            for name, measurement_unit in batch:
+                if (name, measurement_unit) in existing:
                     existing_count += 1
-            if new_objects:
-                Ingredient.objects.bulk_create(new_objects)
-                self.stdout.write(self.style.SUCCESS(
-                    f'Добавление данных завершено. '
-                    f'Добавлено {len(new_objects)} записей. '
-                    f'{existing_count} записей уже существовало.'
-                ))
+                    continue
+                existing.add((name, measurement_unit))
+                new_objects.append(Ingredient(
+                    name=name,
+                    measurement_unit=measurement_unit))
+            Ingredient.objects.bulk_create(new_objects, ignore_conflicts=True)
+            created += len(new_objects)
+        return created, existing_count
+
+    def handle(self, *args, **options):
+        path = os.path.join(settings.BASE_DIR, options['path'])
+        readers = {'.csv': read_csv, '.json': read_json}
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in readers:
+            raise CommandError('Поддерживаются только файлы CSV и JSON.')
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = readers[extension](file)
+            if connection.vendor == 'postgresql':
+                created, existing_count = self.import_copy(
+                    rows, options['batch_size'])
             else:
-                self.stdout.write(self.style.WARNING(
-                    'Новых данных не было добавлено. '
-                    'Все данные уже существуют в базе.'
-                ))
+                created, existing_count = self.import_batches(
+                    rows, options['batch_size'])
+        if created:
+            bump_version(Ingredient)
+            self.stdout.write(self.style.SUCCESS(
+                f'Добавление данных завершено. '
+                f'Добавлено {created} записей. '
+                f'{existing_count} записей уже существовало.'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'Новых данных не было добавлено. '
+                'Все данные уже существуют в базе.'
+            ))
@@ -0,0 +1,231 @@
+import csv
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
+
+from api.feed import fan_out
+from api.images import build_variants
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeImport,
+    RecipeIngredient,
+    Tag,
+    change_counter,
+)
+from users.models import User
+
+IMAGE_UPLOAD_TO = 'recipes/images/'
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        yield from json.load(file)
+
+
+def read_csv(path):
+    """Строки CSV: теги через «|», ингредиенты «название;единица;кол-во»
+    через «|»."""
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.DictReader(file):
+            row['tags'] = [
+                tag for tag in row.get('tags', '').split('|') if tag]
+            row['ingredients'] = [
+                dict(zip(('name', 'measurement_unit', 'amount'),
+                         ingredient.split(';')))
+                for ingredient in row.get('ingredients', '').split('|')
+                if ingredient
+            ]
+            yield row
+
+
+def file_checksum(path):
+    checksum = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+class Command(BaseCommand):
+    help = 'Command for bulk importing recipes from a JSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str)
+        parser.add_argument(
+            '--images-dir', type=str, default=settings.BASE_DIR,
+            help='Каталог, относительно которого заданы пути к фото.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def load_maps(self):
+        """Справочники для сопоставления данных файла без запросов в БД."""
+        self.authors = dict(User.objects.values_list('email', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit')
+        }
+
+    def parse(self, row):
+        """Проверяет строку файла и сопоставляет ее со справочниками."""
+        author_id = self.authors.get(row.get('author'))
+        if author_id is None:
+            raise ValueError(f'неизвестный автор "{row.get("author")}"')
+        tag_ids = []
+        for slug in row.get('tags', []):
+            if slug not in self.tags:
+                raise ValueError(f'неизвестный тег "{slug}"')
+            tag_ids.append(self.tags[slug])
+        amounts = {}
+        for ingredient in row.get('ingredients', []):
+            key = (ingredient.get('name'), ingredient.get('measurement_unit'))
+            if key not in self.ingredients:
+                raise ValueError(f'неизвестный ингредиент "{key[0]}"')
+            amount = int(ingredient.get('amount'))
+            if amount < 1:
+                raise ValueError(f'количество "{key[0]}" меньше 1')
+            amounts[self.ingredients[key]] = amount
+        if not row.get('name') or not tag_ids or not amounts:
+            raise ValueError('нет названия, тегов или ингредиентов')
+        cooking_time = int(row.get('cooking_time'))
+        if cooking_time < 1:
+            raise ValueError('время приготовления меньше 1 минуты')
+        recipe = Recipe(
+            author_id=author_id,
+            name=row['name'],
+            text=row.get('text', ''),
+            cooking_time=cooking_time,
+        )
+        return recipe, tag_ids, amounts, row.get('image')
+
+    def save_image(self, path):
+        """Проверяет фото и сохраняет его в хранилище медиафайлов."""
+        if not path:
+            return None
+        path = os.path.join(self.images_dir, path)
+        try:
+            with Image.open(path) as image:
+                image.verify()
+            with open(path, 'rb') as file:
+                return default_storage.save(
+                    IMAGE_UPLOAD_TO + os.path.basename(path), File(file))
+        except OSError as error:
+            self.stderr.write(f'Фото {path} не загружено: {error}.')
+            return None
+
+    @staticmethod
+    def delete_images(names):
+        """Удаляет фото пачки, которая не попала в БД.
+
+        Хранилище сохраняет одинаковые файлы один раз, поэтому фото,
+        которые уже есть у других Рецептов, остаются.
+        """
+        used = set(Recipe.objects.filter(image__in=names).values_list(
+            'image', flat=True))
+        for name in set(names) - used:
+            default_storage.delete(name)
+
+    def save_recipes(self, parsed):
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create([recipe for recipe, *_ in parsed])
+        else:
+            for recipe, *_ in parsed:
+                recipe.save()
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe, tag_ids, *_ in parsed
+            for tag_id in set(tag_ids)
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe.id,
+                ingredient_id=ingredient_id,
+                amount=amount)
+            for recipe, _, amounts, _ in parsed
+            for ingredient_id, amount in amounts.items()
+        ])
+        authors = Counter(recipe.author_id for recipe, *_ in parsed)
+        for author_id, count in authors.items():
+            change_counter(User, author_id, 'recipes_count', count)
+
+    def import_batch(self, rows, first_row, pool):
+        parsed = []
+        for number, row in enumerate(rows, first_row + 1):
+            try:
+                parsed.append(self.parse(row))
+            except (TypeError, ValueError) as error:
+                self.errors += 1
+                self.stderr.write(f'Строка {number}: {error}.')
+        images = list(
+            pool.map(self.save_image, [image for *_, image in parsed]))
+        for (recipe, *_), image in zip(parsed, images):
+            recipe.image = image
+        try:
+            with transaction.atomic():
+                self.save_recipes(parsed)
+                fan_out(recipe for recipe, *_ in parsed)
+                self.progress.processed = first_row + len(rows)
+                self.progress.save(update_fields=('processed', 'updated_at'))
+        except Exception:
+            self.delete_images([image for image in images if image])
+            raise
+        for recipe, *_ in parsed:
+            if recipe.image:
+                pool.submit(build_variants, recipe.id, recipe.image.name)
+        return len(parsed)
+
+    def handle(self, *args, **options):
+        path = os.path.join(settings.BASE_DIR, options['path'])
+        readers = {'.json': read_json, '.csv': read_csv}
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in readers:
+            raise CommandError('Поддерживаются только файлы JSON и CSV.')
+        self.images_dir = options['images_dir']
+        batch_size = options['batch_size']
+        self.errors = 0
+        self.progress, _ = RecipeImport.objects.get_or_create(
+            checksum=file_checksum(path))
+        if self.progress.processed:
+            self.stdout.write(
+                f'Продолжение импорта '
+                f'со строки {self.progress.processed + 1}.')
+        self.load_maps()
+
+        rows = islice(readers[extension](path), self.progress.processed, None)
+        created = 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                first_row = self.progress.processed
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                batch_started = time.monotonic()
+                count = self.import_batch(batch, first_row, pool)
+                created += count
+                self.stdout.write(
+                    f'Строки {first_row + 1}-{self.progress.processed}: '
+                    f'создано {count} рецептов, '
+                    f'{count / (time.monotonic() - batch_started):.0f} '
+                    f'рецептов/с.'
+                )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен. Создано {created} рецептов за {elapsed:.1f} с '
+            f'({created / elapsed if elapsed else 0:.0f} рецептов/с), '
+            f'ошибок {self.errors}.'
+        ))
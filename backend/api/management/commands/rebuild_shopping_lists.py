@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingList
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Command for rebuilding and verifying shopping lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить списки покупок, не перестраивая их.'
+        )
+
+    @staticmethod
+    def live_aggregate():
+        """Списки покупок, посчитанные по Корзинам."""
+        return RecipeIngredient.objects.filter(
+            recipe__recipes_in_cart__isnull=False
+        ).values(
+            'recipe__recipes_in_cart__user', 'ingredient'
+        ).annotate(
+            total_amount=Sum('amount')
+        ).values_list(
+            'recipe__recipes_in_cart__user', 'ingredient', 'total_amount'
+        ).order_by()
+
+    def rebuild(self):
+        with transaction.atomic():
+            ShoppingList.objects.all().delete()
+            batch = []
+            created = 0
+            for user_id, ingredient_id, amount in (
+                    self.live_aggregate().iterator()):
+                batch.append(ShoppingList(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount))
+                if len(batch) >= BATCH_SIZE:
+                    ShoppingList.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            ShoppingList.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f'Создано {created} позиций списков покупок.')
+
+    def verify(self):
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in self.live_aggregate()
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            ShoppingList.objects.values_list(
+                'user_id', 'ingredient_id', 'amount')
+        }
+        mismatches = [
+            (key, stored.get(key), expected.get(key))
+            for key in expected.keys() | stored.keys()
+            if stored.get(key) != expected.get(key)
+        ]
+        for (user_id, ingredient_id), actual, amount in mismatches[:20]:
+            self.stdout.write(self.style.WARNING(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'сохранено {actual}, ожидалось {amount}.'
+            ))
+        if mismatches:
+            raise CommandError(
+                f'Списки покупок расходятся с Корзинами: '
+                f'{len(mismatches)} позиций.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок совпадают с Корзинами '
+            f'({len(expected)} позиций).'
+        ))
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            self.rebuild()
+        self.verify()
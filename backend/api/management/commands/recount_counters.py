@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+def actual_count(model, field):
+    """Подзапрос с фактическим числом связанных записей."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = 'Command for reconciling denormalized counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только найти расхождения, не исправляя их.'
+        )
+
+    def handle(self, *args, **options):
+        mismatched_total = 0
+        with transaction.atomic():
+            for model, counter, related_model, field in COUNTERS:
+                mismatched = model.objects.annotate(
+                    actual=actual_count(related_model, field)
+                ).exclude(**{counter: F('actual')}).values_list(
+                    'pk', flat=True)
+                pks = list(mismatched)
+                mismatched_total += len(pks)
+                if pks and not options['check']:
+                    model.objects.filter(pk__in=pks).update(
+                        **{counter: actual_count(related_model, field)})
+                self.stdout.write(
+                    f'{model._meta.label}.{counter}: '
+                    f'расхождений {len(pks)}.'
+                )
+        if options['check'] and mismatched_total:
+            raise CommandError(
+                f'Счетчики расходятся с данными: {mismatched_total}.')
+        self.stdout.write(self.style.SUCCESS('Сверка счетчиков завершена.'))
@@ -1,4 +1,11 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from foodgram.constants import PAGE_SIZE
 
@@ -7,3 +14,122 @@ class CustomPagination(PageNumberPagination):
     """Кастомный пагинатор."""
     page_size_query_param = 'limit'
     page_size = PAGE_SIZE
+
+
+class CustomCursorPagination(CustomPagination):
+    """Кастомный пагинатор с режимом курсора (keyset).
+
+    Без параметра cursor работает как CustomPagination. С параметром
+    cursor (пустым для первой страницы) страницы выбираются условием
+    по ключу сортировки view.cursor_ordering без COUNT и OFFSET;
+    последнее поле ключа должно быть уникальным. Если queryset
+    упорядочен по аннотации (релевантность поиска, доля ингредиентов),
+    она становится первым полем ключа.
+    """
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def use_keyset(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.use_keyset(request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.ordering = self.get_ordering(queryset, view)
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset)
+        if position:
+            queryset = queryset.filter(self.position_filter(position))
+        page = list(queryset.order_by(*self.ordering)[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = [
+                getattr(page[-1], field.lstrip('-'))
+                for field in self.ordering
+            ]
+        return page
+
+    def get_ordering(self, queryset, view):
+        """Ключ: аннотации из order_by queryset, затем cursor_ordering."""
+        annotations = []
+        for field in queryset.query.order_by:
+            if (not isinstance(field, str)
+                    or field.lstrip('-') not in queryset.query.annotations):
+                break
+            annotations.append(field)
+        return (*annotations,
+                *getattr(view, 'cursor_ordering', self.ordering))
+
+    def position_filter(self, position):
+        """Условие «после позиции» для составного ключа сортировки."""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(
+                **{
+                    previous.lstrip('-'): position[number]
+                    for number, previous in enumerate(self.ordering[:index])
+                },
+                **{f'{name}__{lookup}': position[index]}
+            )
+        return condition
+
+    @staticmethod
+    def output_field(queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self.output_field(
+                    queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position
+        ]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class FeedPagination(CustomCursorPagination):
+    """Пагинатор лент: всегда в режиме курсора."""
+
+    def use_keyset(self, request):
+        return True
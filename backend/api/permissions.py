@@ -9,7 +9,7 @@ class IsAuthorPermission(permissions.BasePermission):
                 or request.method in permissions.SAFE_METHODS)
 
     def has_object_permission(self, request, view, obj):
-        return (obj.author == request.user
+        return (obj.author_id == request.user.id
                 or request.method in permissions.SAFE_METHODS
                 or request.user.is_authenticated
                 and request.user.is_superuser)
@@ -0,0 +1,135 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db.models import Count
+
+from foodgram.constants import (
+    SIMILAR_INTERACTION_WEIGHT,
+    SIMILAR_MAX_FEATURE_RECIPES,
+)
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+
+FEATURES = (
+    ('ingredient', RecipeIngredient, 'ingredient_id'),
+    ('tag', Recipe.tags.through, 'tag_id'),
+)
+
+
+class RecipeSimilarity:
+    """Данные для расчета похожих Рецептов.
+
+    Разреженная матрица Пользователь×Рецепт по Избранному и Корзинам
+    хранится двумя индексами (Пользователи Рецепта и Рецепты Пользователя),
+    признаки Рецепта - множеством его ингредиентов и тегов. Сходство
+    считается только по непустым ячейкам матрицы.
+
+    С recipe_ids загружаются только строки, нужные для соседей этих
+    Рецептов: их Пользователи и признаки, Рецепты этих Пользователей
+    и Рецепты с теми же редкими признаками, а для найденных кандидатов -
+    их Пользователи и признаки. Без recipe_ids загружается вся матрица.
+    """
+
+    def __init__(self, recipe_ids=None):
+        self.users = defaultdict(set)
+        self.baskets = defaultdict(set)
+        self.features = defaultdict(set)
+        self.postings = defaultdict(set)
+        self.frequent = set()
+        if recipe_ids is None:
+            self.load_interactions()
+            self.load_features()
+            return
+        recipe_ids = set(recipe_ids)
+        self.load_features(recipe_ids=recipe_ids)
+        self.load_postings(set().union(*(
+            self.features[recipe_id] for recipe_id in recipe_ids)))
+        self.load_interactions(recipe_id__in=recipe_ids)
+        self.load_interactions(user_id__in=set().union(*(
+            self.users[recipe_id] for recipe_id in recipe_ids)))
+        candidates = set().union(*(
+            self.candidates(recipe_id)[0] for recipe_id in recipe_ids))
+        candidates -= recipe_ids
+        self.load_interactions(recipe_id__in=candidates)
+        self.load_features(recipe_ids=candidates)
+
+    def load_interactions(self, **lookups):
+        for model in (Favorite, ShoppingCart):
+            for user_id, recipe_id in model.objects.filter(
+                    **lookups).values_list('user_id', 'recipe_id').iterator():
+                self.users[recipe_id].add(user_id)
+                self.baskets[user_id].add(recipe_id)
+
+    def load_features(self, recipe_ids=None, features=None):
+        """Признаки Рецептов recipe_ids или Рецептов с признаками features."""
+        for kind, model, field in FEATURES:
+            rows = model.objects.all()
+            if recipe_ids is not None:
+                rows = rows.filter(recipe_id__in=recipe_ids)
+            if features is not None:
+                rows = rows.filter(**{f'{field}__in': [
+                    pk for name, pk in features if name == kind]})
+            for recipe_id, pk in rows.values_list(
+                    'recipe_id', field).iterator():
+                self.add_feature(recipe_id, (kind, pk))
+
+    def load_postings(self, features):
+        """Загружает все Рецепты с редкими признаками из features.
+
+        Частые признаки только запоминаются: кандидатов по ним
+        candidates не ищет.
+        """
+        for kind, model, field in FEATURES:
+            counts = model.objects.filter(**{f'{field}__in': [
+                pk for name, pk in features if name == kind
+            ]}).order_by().values(field).annotate(
+                count=Count('id')).values_list(field, 'count')
+            self.frequent.update(
+                (kind, pk) for pk, count in counts
+                if count > SIMILAR_MAX_FEATURE_RECIPES)
+        self.load_features(features=features - self.frequent)
+
+    def add_feature(self, recipe_id, feature):
+        self.features[recipe_id].add(feature)
+        self.postings[feature].add(recipe_id)
+
+    def candidates(self, recipe_id):
+        """Рецепты с общими Пользователями и с общими редкими признаками.
+
+        Возвращает кандидатов и число общих Пользователей с каждым.
+        """
+        shared_users = Counter()
+        for user_id in self.users.get(recipe_id, ()):
+            shared_users.update(self.baskets[user_id])
+        candidates = set(shared_users)
+        for feature in self.features.get(recipe_id, ()):
+            posting = self.postings[feature]
+            if (feature not in self.frequent
+                    and len(posting) <= SIMILAR_MAX_FEATURE_RECIPES):
+                candidates.update(posting)
+        candidates.discard(recipe_id)
+        return candidates, shared_users
+
+    def neighbours(self, recipe_id, count):
+        """count самых похожих Рецептов: [(сходство, id), ...].
+
+        Сходство - взвешенная сумма косинусного сходства по
+        Пользователям и коэффициента Жаккара по ингредиентам и тегам.
+        """
+        candidates, shared_users = self.candidates(recipe_id)
+        users_count = len(self.users.get(recipe_id, ()))
+        features = self.features.get(recipe_id, set())
+        scores = []
+        for other in candidates:
+            interaction = 0.0
+            if shared_users[other]:
+                interaction = shared_users[other] / math.sqrt(
+                    users_count * len(self.users[other]))
+            other_features = self.features.get(other, set())
+            union = len(features | other_features)
+            content = len(features & other_features) / union if union else 0
+            score = (SIMILAR_INTERACTION_WEIGHT * interaction
+                     + (1 - SIMILAR_INTERACTION_WEIGHT) * content)
+            if score > 0:
+                scores.append((round(score, 6), other))
+        return heapq.nlargest(count, scores)
@@ -0,0 +1,192 @@
+import threading
+import time
+from bisect import bisect_left
+from importlib import import_module
+
+from django.db import connections
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    FloatField,
+    OuterRef,
+    Subquery,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from foodgram.constants import INGREDIENT_INDEX_TTL
+from recipes.models import Ingredient, RecipeIngredient
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска без учета регистра и «ё»."""
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+class IngredientIndex:
+    """Индекс названий Ингредиентов в памяти процесса.
+
+    Строится при первом обращении и сбрасывается при изменении
+    Ингредиентов; изменения из других процессов подхватываются
+    не позже, чем через INGREDIENT_INDEX_TTL секунд.
+    """
+
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None
+        self._keys = None
+        self._built_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+            self._keys = None
+
+    def _get_entries(self):
+        with self._lock:
+            if (self._entries is None
+                    or time.monotonic() - self._built_at > self.ttl):
+                entries = sorted(
+                    (normalize(ingredient.name), ingredient.id, ingredient)
+                    for ingredient in Ingredient.objects.all()
+                )
+                self._entries = entries
+                self._keys = [(name, id) for name, id, _ in entries]
+                self._built_at = time.monotonic()
+            return self._entries, self._keys
+
+    def search(self, query, limit):
+        """Сначала совпадения по началу названия, затем по вхождению."""
+        entries, keys = self._get_entries()
+        query = normalize(query)
+        if not query:
+            return []
+        results = []
+        start = bisect_left(keys, (query,))
+        for name, _, ingredient in entries[start:]:
+            if not name.startswith(query) or len(results) >= limit:
+                break
+            results.append(ingredient)
+        for name, _, ingredient in entries:
+            if len(results) >= limit:
+                break
+            if query in name and not name.startswith(query):
+                results.append(ingredient)
+        return results
+
+
+ingredient_index = IngredientIndex()
+
+
+def match_ingredients(queryset, ingredient_ids):
+    """Рецепты из queryset хотя бы с одним из ингредиентов.
+
+    Рецепты упорядочены по доле своих ингредиентов, которые есть
+    в запросе, затем по новизне. Доля считается в БД тем же запросом,
+    что применяет фильтры queryset, по индексам связи Рецепта
+    с Ингредиентом.
+    """
+    ingredient_ids = list(set(ingredient_ids))
+    contents = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+        count=Count('pk')).values('count')
+    matched = contents.filter(ingredient_id__in=ingredient_ids)
+    return queryset.filter(Exists(RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk'), ingredient_id__in=ingredient_ids))
+    ).annotate(coverage=ExpressionWrapper(
+        Cast(Subquery(matched), FloatField()) / Subquery(contents),
+        output_field=FloatField())
+    ).order_by('-coverage', '-pub_date', '-id')
+
+
+POSTGRES_SEARCH_VECTOR = (
+    "to_tsvector('russian', coalesce(recipes_recipe.name, '') "
+    "|| ' ' || coalesce(recipes_recipe.text, ''))"
+)
+
+
+def fts5_query(value):
+    """Запрос FTS5: каждое слово в кавычках и с поиском по префиксу."""
+    words = value.replace('"', ' ').split()
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, value):
+    """Полнотекстовый поиск Рецептов по названию и описанию.
+
+    PostgreSQL использует GIN-индексы по tsvector и триграммам,
+    SQLite - таблицу FTS5, которые создаются миграцией
+    recipes.0004_recipe_search_index. Результат упорядочен
+    по релевантности.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        match = RawSQL(
+            f"{POSTGRES_SEARCH_VECTOR} @@ plainto_tsquery('russian', %s) "
+            f"OR %s <%% recipes_recipe.name",
+            (value, value), output_field=BooleanField())
+        rank = RawSQL(
+            f"ts_rank({POSTGRES_SEARCH_VECTOR}, "
+            f"plainto_tsquery('russian', %s)) "
+            f"+ word_similarity(%s, recipes_recipe.name)",
+            (value, value), output_field=FloatField())
+    elif vendor == 'sqlite':
+        value = fts5_query(value)
+        if not value:
+            return queryset.none()
+        match = RawSQL(
+            'recipes_recipe.id IN (SELECT rowid FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s)',
+            (value,), output_field=BooleanField())
+        rank = RawSQL(
+            '(SELECT -bm25(recipes_recipe_fts, 10.0, 1.0) '
+            'FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s '
+            'AND rowid = recipes_recipe.id)',
+            (value,), output_field=FloatField())
+    else:
+        return queryset.filter(name__icontains=value)
+    return queryset.annotate(
+        search_match=match,
+        search_rank=rank,
+    ).filter(search_match=True).order_by(
+        '-search_rank', '-pub_date', '-id')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_migrate)
+def restore_sqlite_search_index(using, **kwargs):
+    """Восстанавливает триггеры FTS5 после пересоздания таблицы Рецептов.
+
+    SQLite изменяет схему таблицы через ее копирование, при котором
+    триггеры удаляются.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' "
+            "AND name IN ('recipes_recipe', 'recipes_recipe_fts')")
+        if cursor.fetchone()[0] != 2:
+            return
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'recipes_recipe' "
+            "AND name LIKE 'recipes_recipe_fts_%'")
+        if cursor.fetchone()[0] == 3:
+            return
+        migration = import_module(
+            'recipes.migrations.0004_recipe_search_index')
+        for sql in migration.SQLITE_FORWARD:
+            cursor.execute(sql)
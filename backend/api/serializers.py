@@ -1,4 +1,12 @@
-from django.core.exceptions import ObjectDoesNotExist
+import base64
+import hashlib
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
 from rest_framework import serializers
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_base64.fields import Base64ImageField
@@ -9,9 +17,70 @@ from recipes.models import (
     Recipe,
     RecipeIngredient,
     ShoppingCart,
-    Tag
+    ShoppingList,
+    Tag,
+    change_counter
 )
+from foodgram.constants import RECIPE_BATCH_SIZE, RECIPE_CACHE_TIMEOUT
+from foodgram.routers import current_replica, read_primary
 from users.models import Subscription, User
+from .cache import recipe_cache_key, recipe_versions
+from .feed import publish
+from .images import schedule_variants
+
+
+class RecipeImageField(serializers.Field):
+    """Ссылка на фото Рецепта в подходящем для контекста размере.
+
+    Размер берется из context['image_variant'] или параметра variant;
+    пока уменьшенная копия не готова, отдается исходное фото.
+    """
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        variant = self.context.get('image_variant', self.variant)
+        name = recipe.image_variants.get(variant)
+        url = default_storage.url(name) if name else recipe.image.url
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class HashedBase64ImageField(Base64ImageField):
+    """Фото в base64, которое не разбирается повторно, если уже сохранено.
+
+    Хранилище раскладывает файлы по хешу содержимого, поэтому по хешу
+    присланных данных можно найти уже сохраненный файл и вернуть его имя
+    без проверки изображения и новой записи на диск.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data.startswith('data:'):
+            return super().to_internal_value(data)
+        header, _, payload = data.partition(';base64,')
+        extension = header.split('/')[-1]
+        try:
+            content = base64.b64decode(payload)
+        except ValueError:
+            self.fail('invalid')
+        hashed_name = getattr(default_storage, 'hashed_name', None)
+        if hashed_name is not None:
+            model_field = self.parent.Meta.model._meta.get_field(self.source)
+            name = hashed_name(
+                model_field.generate_filename(None, f'image.{extension}'),
+                hashlib.sha256(content).hexdigest())
+            if default_storage.exists(name):
+                return name
+        return super().to_internal_value(
+            ContentFile(content, name=f'image.{extension}'))
 
 
 class BaseShoppingCartFavoriteModelSerializer(serializers.ModelSerializer):
@@ -20,7 +89,11 @@ class BaseShoppingCartFavoriteModelSerializer(serializers.ModelSerializer):
     class Meta:
         abstract = True
 
-    def get_field(self, obj, model):
+    def get_field(self, obj, model, annotation):
+        """Значение флага из аннотации queryset или запросом к БД."""
+        annotated = getattr(obj, annotation, None)
+        if annotated is not None:
+            return annotated
         request = self.context.get('request')
         if request and not request.user.is_anonymous:
             return model.objects.filter(
@@ -35,12 +108,26 @@ class BaseSubscriptionModelSerializer(serializers.ModelSerializer):
     class Meta:
         abstract = True
 
+    def get_subscriptions(self, user):
+        """Множество id авторов, на которых подписан пользователь.
+
+        Загружается один раз и хранится в контексте сериализатора,
+        общем для всех вложенных сериализаторов ответа.
+        """
+        subscriptions = self.context.get('subscriptions')
+        if subscriptions is None:
+            subscriptions = set(Subscription.objects.filter(
+                user=user).values_list('author_id', flat=True))
+            self.context['subscriptions'] = subscriptions
+        return subscriptions
+
     def get_field(self, obj):
+        subscribed = getattr(obj, 'subscribed', None)
+        if subscribed is not None:
+            return subscribed
         request = self.context.get('request')
         if request and not request.user.is_anonymous:
-            return Subscription.objects.filter(
-                user=request.user,
-                author=obj).exists()
+            return obj.id in self.get_subscriptions(request.user)
         return False
 
 
@@ -151,6 +238,78 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         )
 
 
+def prefetch_recipes(recipes):
+    """Загружает автора, теги и ингредиенты Рецептов для отображения."""
+    prefetch_related_objects(
+        recipes,
+        'author',
+        'tags',
+        Prefetch(
+            'recipes',
+            queryset=RecipeIngredient.objects.select_related('ingredient')),
+    )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список Рецептов с кэшем общих для всех пользователей данных.
+
+    Представления читаются из кэша одним запросом, заново строятся
+    только отсутствующие в кэше. Флаги текущего пользователя
+    накладываются поверх кэшированных данных.
+    """
+
+    def to_representation(self, data):
+        if self.context.get('skip_cache'):
+            return super().to_representation(data)
+        if isinstance(data, models.Manager):
+            data = data.all()
+        recipes = list(data)
+        versions = recipe_versions()
+        keys = {
+            recipe.id: recipe_cache_key(recipe.id, versions)
+            for recipe in recipes
+        }
+        cached = cache.get_many(keys.values())
+        misses = [
+            recipe for recipe in recipes if keys[recipe.id] not in cached]
+        if misses:
+            cached.update(self.render_misses(misses, keys))
+        return [
+            self.child.overlay(cached[keys[recipe.id]], recipe)
+            for recipe in recipes
+            if keys[recipe.id] in cached
+        ]
+
+    @staticmethod
+    def render_misses(misses, keys):
+        """Строит и кэширует представления Рецептов по данным основной БД.
+
+        Если страница прочитана с реплики, Рецепты перечитываются
+        с основной БД, чтобы не вернуть в кэш устаревшие данные.
+        """
+        from_replica = current_replica.get() is not None
+        with read_primary():
+            if from_replica:
+                fresh = Recipe.objects.in_bulk(
+                    [recipe.id for recipe in misses])
+                misses = [
+                    fresh[recipe.id] for recipe in misses
+                    if recipe.id in fresh
+                ]
+            prefetch_recipes(misses)
+            rendered = RecipeReadSerializer(
+                misses,
+                many=True,
+                context={'skip_cache': True, 'image_variant': 'medium'}
+            ).data
+        rendered = {
+            keys[recipe.id]: representation
+            for recipe, representation in zip(misses, rendered)
+        }
+        cache.set_many(rendered, RECIPE_CACHE_TIMEOUT)
+        return rendered
+
+
 class RecipeReadSerializer(BaseShoppingCartFavoriteModelSerializer):
     """Serializer для получения списка рецептов."""
     tags = TagSerializer(
@@ -164,7 +323,7 @@ class RecipeReadSerializer(BaseShoppingCartFavoriteModelSerializer):
         source='recipes')
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -180,20 +339,28 @@ class RecipeReadSerializer(BaseShoppingCartFavoriteModelSerializer):
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
 
-    def get_field(self, obj, model):
+    def overlay(self, data, instance):
+        """Накладывает на представление Рецепта данные пользователя."""
+        data = dict(data)
         request = self.context.get('request')
+        is_subscribed = False
         if request and not request.user.is_anonymous:
-            return model.objects.filter(
-                user=request.user,
-                recipe=obj).exists()
-        return False
+            is_subscribed = instance.author_id in self.fields[
+                'author'].get_subscriptions(request.user)
+        data['author'] = dict(data['author'], is_subscribed=is_subscribed)
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        if request and data['image']:
+            data['image'] = request.build_absolute_uri(data['image'])
+        return data
 
     def get_is_favorited(self, obj):
-        return self.get_field(obj, Favorite)
+        return self.get_field(obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
-        return self.get_field(obj, ShoppingCart)
+        return self.get_field(obj, ShoppingCart, 'is_in_shopping_cart')
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
@@ -217,7 +384,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     )
     author = CustomUserReadSerializer(read_only=True)
     ingredients = RecipeIngredientCreateSerializer(many=True, )
-    image = Base64ImageField()
+    image = HashedBase64ImageField()
 
     class Meta:
         model = Recipe
@@ -239,17 +406,15 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 'tags': 'Теги не должны '
                         'повторяться в рецепте.'})
         ingredients = obj.get('ingredients', [])
-        unique_ingredient = set()
-        for ingredient in ingredients:
-            id = ingredient.get('id')
-            if id in unique_ingredient:
-                raise serializers.ValidationError({
-                    'ingredients': 'Ингредиенты не должны '
-                                   'повторяться в рецепте.'})
-            unique_ingredient.add(id)
-            try:
-                Ingredient.objects.get(pk=id)
-            except ObjectDoesNotExist:
+        ids = [ingredient.get('id') for ingredient in ingredients]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError({
+                'ingredients': 'Ингредиенты не должны '
+                               'повторяться в рецепте.'})
+        existing = set(Ingredient.objects.filter(
+            pk__in=ids).values_list('pk', flat=True))
+        for id in ids:
+            if id not in existing:
                 raise serializers.ValidationError({
                     'ingredients': f'Недопустимый первичный ключ "{id}"'
                                    f' - объект не существует.'})
@@ -266,45 +431,112 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     @staticmethod
     def create_objects(recipe, tags, ingredients):
         """Вспомогательный метод для создания записей в БД."""
-        recipe.tags.clear()
-        for tag in tags:
-            recipe.tags.add(tag)
-
-        recipe_ingredients = []
-        for ingredient in ingredients:
-            recipe_ingredient = RecipeIngredient(
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
                 recipe=recipe,
-                ingredient=Ingredient.objects.get(pk=ingredient['id']),
-                amount=ingredient['amount']
-            )
-            recipe_ingredients.append(recipe_ingredient)
-
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount'])
+            for ingredient in ingredients
+        ])
 
     def create(self, validated_data):
         """Создание Рецепта."""
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         author = self.context['request'].user
-        recipe = Recipe.objects.create(author=author, **validated_data)
-        self.create_objects(recipe, tags, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(author=author, **validated_data)
+            change_counter(User, author.id, 'recipes_count', 1)
+            self.create_objects(recipe, tags, ingredients)
+            publish(recipe)
+            schedule_variants(recipe)
         return recipe
 
+    @staticmethod
+    def update_shopping_lists(recipe, amounts, current_amounts):
+        """Переносит изменение ингредиентов в списки покупок
+        Пользователей, у которых Рецепт лежит в Корзине."""
+        ShoppingList.apply_recipe_change(recipe.id, amounts, current_amounts)
+
+    @staticmethod
+    def update_ingredients(recipe, amounts, current):
+        """Записывает в БД только изменившиеся ингредиенты Рецепта."""
+        removed = [
+            recipe_ingredient.id
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id not in amounts
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ])
+
+    @staticmethod
+    def update_tags(recipe, tag_ids, current):
+        """Записывает в БД только изменившиеся теги Рецепта."""
+        removed = current - tag_ids
+        if removed:
+            Recipe.tags.through.objects.filter(
+                recipe=recipe, tag_id__in=removed).delete()
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+            for tag_id in tag_ids - current
+        ])
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Изменение Рецепта."""
         tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        instance.ingredients.clear()
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in validated_data.pop('ingredients')
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=instance)
+        }
+        self.update_shopping_lists(instance, amounts, {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        })
+        tag_ids = {tag.id for tag in tags}
+        current_tags = set(instance.tags.values_list('id', flat=True))
+        if set(amounts) != set(current) or tag_ids != current_tags:
+            instance.features_changed_at = timezone.now()
+        self.update_ingredients(instance, amounts, current)
+        self.update_tags(instance, tag_ids, current_tags)
         instance.name = validated_data.get('name', instance.name)
-        instance.image = validated_data.get('image', instance.image)
+        image = validated_data.get('image')
+        image_changed = image is not None and image != instance.image.name
+        if image_changed:
+            instance.image = image
+            instance.image_variants = {}
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time)
-        self.create_objects(instance, tags, ingredients)
         instance.save()
+        if image_changed:
+            schedule_variants(instance)
         return instance
 
     def to_representation(self, instance):
+        prefetch_recipes((instance,))
         request = self.context.get('request')
         context = {'request': request}
         return RecipeReadSerializer(instance, context=context).data
@@ -313,7 +545,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer для краткого отображения Рецепта."""
     name = serializers.ReadOnlyField()
-    image = Base64ImageField(read_only=True)
+    image = RecipeImageField(variant='thumb')
     cooking_time = serializers.ReadOnlyField()
 
     class Meta:
@@ -326,6 +558,37 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
 
+class ShoppingListSerializer(serializers.ModelSerializer):
+    """Serializer для Списка покупок."""
+    id = serializers.ReadOnlyField(
+        source='ingredient.id')
+    name = serializers.ReadOnlyField(
+        source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+
+    class Meta:
+        model = ShoppingList
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+            'amount'
+        )
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Serializer списка Рецептов для пакетного добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RECIPE_BATCH_SIZE,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class SubscriptionSerializer(BaseSubscriptionModelSerializer):
     """Serializer для Подписок."""
     email = serializers.ReadOnlyField()
@@ -334,7 +597,7 @@ class SubscriptionSerializer(BaseSubscriptionModelSerializer):
     last_name = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -353,17 +616,16 @@ class SubscriptionSerializer(BaseSubscriptionModelSerializer):
         return self.get_field(obj)
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes = obj.recipes.all()
-        limit = request.GET.get('recipes_limit')
-        if limit:
-            recipes = recipes[:int(limit)]
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            request = self.context.get('request')
+            recipes = obj.recipes.all()
+            limit = request.GET.get('recipes_limit')
+            if limit:
+                recipes = recipes[:int(limit)]
         serializer = RecipeSerializer(
             recipes,
             many=True,
             read_only=True
         )
         return serializer.data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
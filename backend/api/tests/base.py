@@ -0,0 +1,117 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from api.authentication import TokenCache
+from api.search import ingredient_index
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+class InlineExecutor:
+    """Фоновый пул для тестов: задачи выполняются сразу в том же потоке."""
+
+    def submit(self, task, *args, **kwargs):
+        task(*args, **kwargs)
+
+
+def image_data(color='red', size=(4, 4)):
+    """Фото в base64, как его присылает фронтенд."""
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@override_settings(
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    MEDIA_ROOT=MEDIA_ROOT,
+    DATABASE_REPLICAS=[],
+    REQUEST_METRICS_SAMPLE_RATE=0,
+    BACKGROUND_REPAIR=False,
+)
+class FoodgramTestCase(APITestCase):
+    """Общие данные и изоляция кэшей в памяти процесса для тестов API."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = cls.create_user('author')
+        cls.user = cls.create_user('user')
+        cls.other = cls.create_user('other')
+        cls.breakfast = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+        cls.lunch = Tag.objects.create(
+            name='Обед', color='#49B64E', slug='lunch')
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Абрикос', 'Банан', 'Вишня', 'Груша', 'Дыня')
+        ]
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.invalidate()
+        for target, instance in (
+            ('api.authentication.token_cache', TokenCache()),
+            ('api.images._executor', InlineExecutor()),
+        ):
+            patcher = mock.patch(target, instance)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def create_user(username, **fields):
+        return User.objects.create_user(
+            username=username,
+            email=f'{username}@foodgram.ru',
+            first_name=username,
+            last_name=username,
+            password='Secret-password-1',
+            **fields)
+
+    def create_recipe(self, author=None, amounts=None, tags=None,
+                      name='Рецепт', **fields):
+        """Рецепт напрямую в БД: amounts - {Ингредиент: количество}."""
+        recipe = Recipe.objects.create(**{
+            'author': author or self.author, 'name': name,
+            'text': 'Описание', 'cooking_time': 10, **fields})
+        recipe.tags.set(tags or (self.breakfast,))
+        if amounts is None:
+            amounts = {self.ingredients[0]: 100}
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in amounts.items()
+        ])
+        return recipe
+
+    def recipe_payload(self, amounts=None, tags=None, image=None, **fields):
+        """Данные для создания Рецепта через API."""
+        if amounts is None:
+            amounts = {self.ingredients[0]: 100}
+        return {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': image or image_data(),
+            'tags': [tag.id for tag in tags or (self.breakfast,)],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in amounts.items()
+            ],
+            **fields,
+        }
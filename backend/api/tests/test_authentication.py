@@ -0,0 +1,65 @@
+from unittest import mock
+
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication, TokenCache
+from .base import FoodgramTestCase
+
+
+class CachedTokenAuthenticationTests(FoodgramTestCase):
+    """Кэш токенов и отзыв токенов во всех процессах."""
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.key = self.token.key
+        self.authentication = CachedTokenAuthentication()
+
+    def authenticate(self):
+        return self.authentication.authenticate_credentials(self.key)
+
+    def in_other_worker(self):
+        """Кэш токенов другого процесса с тем же общим кэшем Django."""
+        return mock.patch('api.authentication.token_cache', TokenCache())
+
+    def test_cached_token_skips_database(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+        self.assertEqual(user, self.user)
+        self.assertEqual(token, self.token)
+
+    def test_token_deleted_in_other_worker(self):
+        self.authenticate()
+        with self.in_other_worker(), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_user_deactivated_in_other_worker(self):
+        self.authenticate()
+        with self.in_other_worker(), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_password_changed_in_other_worker(self):
+        self.authenticate()
+        with self.in_other_worker(), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('Another-password-2')
+            self.user.save()
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+    def test_logout_revokes_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
@@ -0,0 +1,74 @@
+from recipes.models import Favorite, Recipe, ShoppingCart, ShoppingList
+from .base import FoodgramTestCase
+
+
+class BatchRecipesTests(FoodgramTestCase):
+    """Пакетное добавление и удаление Рецептов в Избранном и Корзине."""
+
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_recipe(amounts={self.ingredients[0]: 100})
+        self.second = self.create_recipe(
+            amounts={self.ingredients[0]: 50, self.ingredients[1]: 2})
+        self.client.force_authenticate(self.user)
+
+    def batch(self, method, kind, ids):
+        return getattr(self.client, method)(
+            f'/api/recipes/{kind}/batch/', {'recipes': ids}, format='json')
+
+    def counters(self, field):
+        return dict(Recipe.objects.values_list('id', field))
+
+    def test_add_reports_each_recipe(self):
+        self.client.post(f'/api/recipes/{self.first.id}/favorite/')
+        response = self.batch(
+            'post', 'favorite', [self.first.id, self.second.id, 10 ** 6])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertIn('errors', results[0])
+        self.assertEqual(results[1], {'id': self.second.id,
+                                      'status': 'added'})
+        self.assertIn('errors', results[2])
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user).count(), 2)
+
+    def test_repeated_batch_changes_counters_once(self):
+        ids = [self.first.id, self.second.id]
+        self.batch('post', 'favorite', ids)
+        self.batch('post', 'favorite', ids)
+        self.assertEqual(self.counters('favorites_count'),
+                         {self.first.id: 1, self.second.id: 1})
+        self.batch('delete', 'favorite', ids)
+        self.batch('delete', 'favorite', ids)
+        self.assertEqual(self.counters('favorites_count'),
+                         {self.first.id: 0, self.second.id: 0})
+
+    def test_repeated_cart_batch_adds_amounts_once(self):
+        ids = [self.first.id, self.second.id]
+        self.batch('post', 'shopping_cart', ids)
+        self.batch('post', 'shopping_cart', ids)
+        self.assertEqual(
+            dict(ShoppingList.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'amount')),
+            {self.ingredients[0].id: 150, self.ingredients[1].id: 2})
+        self.assertEqual(self.counters('in_carts_count'),
+                         {self.first.id: 1, self.second.id: 1})
+        self.batch('delete', 'shopping_cart', [self.second.id])
+        self.batch('delete', 'shopping_cart', [self.second.id])
+        self.assertEqual(
+            dict(ShoppingList.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'amount')),
+            {self.ingredients[0].id: 100})
+
+    def test_clear_shopping_cart(self):
+        self.batch('post', 'shopping_cart', [self.first.id, self.second.id])
+        response = self.client.delete('/api/recipes/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(ShoppingCart.objects.filter(user=self.user).exists())
+        self.assertFalse(ShoppingList.objects.filter(user=self.user).exists())
+        self.assertEqual(self.counters('in_carts_count'),
+                         {self.first.id: 0, self.second.id: 0})
+
+    def test_batch_size_is_limited(self):
+        response = self.batch('post', 'favorite', list(range(1, 102)))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,84 @@
+from recipes.models import Tag
+from .base import FoodgramTestCase
+
+
+class ReferenceCacheTests(FoodgramTestCase):
+    """Кэш и условные ответы справочников Тегов и Ингредиентов."""
+
+    def test_cached_without_queries(self):
+        first = self.client.get('/api/ingredients/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/ingredients/')
+        self.assertEqual(second.json(), first.json())
+        self.assertNotIn('Last-Modified', second)
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_each_change_gets_new_etag(self):
+        etags = [self.client.get('/api/ingredients/')['ETag']]
+        for name in ('Абрикосы', 'Абрикос сушеный'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.ingredients[0].name = name
+                self.ingredients[0].save()
+            response = self.client.get(
+                '/api/ingredients/', HTTP_IF_NONE_MATCH=etags[-1])
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(name, [item['name'] for item in response.json()])
+            etags.append(response['ETag'])
+        self.assertEqual(len(set(etags)), 3)
+
+
+class RecipeCacheTests(FoodgramTestCase):
+    """Сброс кэша представлений Рецептов при изменениях."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe()
+
+    def test_recipe_change_is_visible(self):
+        path = f'/api/recipes/{self.recipe.id}/'
+        self.client.get('/api/recipes/')
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(path, self.recipe_payload(
+                amounts={self.ingredients[1]: 5}, name='Новое название'),
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        recipe = self.client.get('/api/recipes/').json()['results'][0]
+        self.assertEqual(recipe['name'], 'Новое название')
+        self.assertEqual(
+            [item['id'] for item in recipe['ingredients']],
+            [self.ingredients[1].id])
+
+    def test_tag_change_is_visible(self):
+        self.client.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.get(pk=self.breakfast.pk)
+            tag.name = 'Ланч'
+            tag.save()
+        recipe = self.client.get('/api/recipes/').json()['results'][0]
+        self.assertEqual(recipe['tags'][0]['name'], 'Ланч')
+
+    def test_admin_ingredient_change_is_visible(self):
+        self.client.get('/api/recipes/')
+        admin = self.create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        recipe_ingredient = self.recipe.recipes.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/admin/recipes/recipeingredient/'
+                f'{recipe_ingredient.id}/change/',
+                {'recipe': self.recipe.id,
+                 'ingredient': self.ingredients[2].id,
+                 'amount': 7})
+        self.assertEqual(response.status_code, 302)
+        self.client.logout()
+        recipe = self.client.get('/api/recipes/').json()['results'][0]
+        self.assertEqual(
+            [(item['id'], item['amount']) for item in recipe['ingredients']],
+            [(self.ingredients[2].id, 7)])
+        self.recipe.refresh_from_db()
+        self.assertIsNotNone(self.recipe.features_changed_at)
@@ -0,0 +1,76 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from api.feed import repair_fan_out
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+from .base import FoodgramTestCase
+
+
+class FeedTests(FoodgramTestCase):
+    """Рассылка Рецептов в ленты подписчиков и лента /recipes/feed/."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        Subscription.objects.create(user=self.other, author=self.author)
+
+    def publish(self):
+        self.author.refresh_from_db()
+        self.client.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/', self.recipe_payload(), format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def feed(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_new_recipe_reaches_followers(self):
+        recipe_id = self.publish()
+        self.assertEqual(self.feed(self.user), [recipe_id])
+        self.assertEqual(self.feed(self.other), [recipe_id])
+        self.assertEqual(self.feed(self.author), [])
+
+    def test_background_fan_out_clears_pending(self):
+        with mock.patch('api.feed.FEED_SYNC_FOLLOWERS', 0):
+            recipe_id = self.publish()
+        self.assertFalse(Recipe.objects.get(pk=recipe_id).feed_pending)
+        self.assertEqual(self.feed(self.other), [recipe_id])
+
+    def test_lost_fan_out_is_repeated(self):
+        with mock.patch('api.feed.FEED_SYNC_FOLLOWERS', 0), \
+                mock.patch('api.feed.run_fan_out'):
+            recipe_id = self.publish()
+        self.assertTrue(Recipe.objects.get(pk=recipe_id).feed_pending)
+        self.assertEqual(self.feed(self.other), [])
+        repair_fan_out()
+        self.assertFalse(Recipe.objects.get(pk=recipe_id).feed_pending)
+        self.assertEqual(self.feed(self.other), [recipe_id])
+        self.assertEqual(self.feed(self.user), [recipe_id])
+
+    def test_command_repeats_pending_fan_out(self):
+        recipe = self.create_recipe(feed_pending=True)
+        output = StringIO()
+        call_command('fan_out_recipes', stdout=output)
+        self.assertIn('1', output.getvalue())
+        self.assertEqual(self.feed(self.user), [recipe.id])
+
+    def test_subscription_fills_and_unsubscribe_clears_feed(self):
+        recipes = [self.create_recipe() for _ in range(3)]
+        reader = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru',
+            password='Secret-password-1')
+        self.client.force_authenticate(reader)
+        self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(
+            self.feed(reader), [recipe.id for recipe in reversed(recipes)])
+        self.client.delete(f'/api/users/{self.author.id}/subscribe/')
+        self.assertFalse(FeedEntry.objects.filter(user=reader).exists())
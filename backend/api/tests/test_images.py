@@ -0,0 +1,108 @@
+import base64
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import override_settings
+
+from api.images import repair_on_start, repair_variants
+from recipes.models import Recipe
+from .base import FoodgramTestCase, image_data
+
+
+def png(color):
+    """Содержимое PNG-файла."""
+    return base64.b64decode(image_data(color).split(',', 1)[1])
+
+
+class ImageVariantsTests(FoodgramTestCase):
+    """Уменьшенные копии фото и повтор потерянных задач."""
+
+    def test_repair_builds_missing_variants(self):
+        name = default_storage.save('recipes/images/a.png',
+                                    ContentFile(png('green')))
+        recipe = self.create_recipe(image=name)
+        done = self.create_recipe(
+            image=default_storage.save('recipes/images/b.png',
+                                       ContentFile(png('red'))),
+            image_variants={'thumb': 'x'})
+        repair_variants()
+        recipe.refresh_from_db()
+        self.assertEqual(set(recipe.image_variants), {'thumb', 'medium'})
+        for variant in recipe.image_variants.values():
+            self.assertTrue(default_storage.exists(variant))
+        done.refresh_from_db()
+        self.assertEqual(done.image_variants, {'thumb': 'x'})
+
+    def test_repair_runs_once_on_first_request(self):
+        task = mock.Mock()
+        repair_on_start(task)
+        self.client.get('/api/tags/')
+        task.assert_not_called()
+        with override_settings(BACKGROUND_REPAIR=True):
+            self.client.get('/api/tags/')
+            self.client.get('/api/tags/')
+        task.assert_called_once_with()
+
+
+class ImportRecipesImagesTests(FoodgramTestCase):
+    """Фото пачки импорта, которая не попала в БД, удаляются."""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch(
+            'api.management.commands.import_recipes.build_variants')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.shared = default_storage.save(
+            'recipes/images/shared.png', ContentFile(png('blue')))
+        self.create_recipe(image=self.shared)
+        rows = []
+        for color in ('blue', 'yellow'):
+            with open(os.path.join(self.directory, f'{color}.png'),
+                      'wb') as file:
+                file.write(png(color))
+            rows.append({
+                'author': self.author.email,
+                'name': color,
+                'text': 'Описание',
+                'cooking_time': 5,
+                'tags': ['breakfast'],
+                'ingredients': [{'name': 'Банан', 'measurement_unit': 'г',
+                                 'amount': 2}],
+                'image': f'{color}.png',
+            })
+        self.path = os.path.join(self.directory, 'recipes.json')
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(rows, file)
+
+    def stored_images(self):
+        return default_storage.listdir('recipes/images/')[1]
+
+    def test_failed_batch_leaves_no_images(self):
+        before = self.stored_images()
+        with mock.patch(
+                'api.management.commands.import_recipes.fan_out',
+                side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                call_command('import_recipes', self.path,
+                             images_dir=self.directory,
+                             stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(self.stored_images(), before)
+        self.assertTrue(default_storage.exists(self.shared))
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_imported_images_are_kept(self):
+        call_command('import_recipes', self.path, images_dir=self.directory,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Recipe.objects.count(), 3)
+        for recipe in Recipe.objects.all():
+            self.assertTrue(default_storage.exists(recipe.image.name))
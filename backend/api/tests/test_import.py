@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from recipes.models import Recipe, RecipeIngredient
+from users.models import User
+from .base import FoodgramTestCase
+
+
+class ImportRecipesTests(FoodgramTestCase):
+    """Импорт Рецептов пачками с продолжением после сбоя."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        rows = [
+            {
+                'author': self.author.email,
+                'name': f'Рецепт {number}',
+                'text': 'Описание',
+                'cooking_time': 5,
+                'tags': ['breakfast', 'lunch'],
+                'ingredients': [{'name': 'Банан', 'measurement_unit': 'г',
+                                 'amount': number}],
+            }
+            for number in range(1, 6)
+        ]
+        rows[2]['tags'] = ['dinner']
+        self.path = os.path.join(self.directory, 'recipes.json')
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(rows, file)
+
+    def import_recipes(self):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_recipes', self.path, batch_size=2,
+                     stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def names(self):
+        return sorted(Recipe.objects.values_list('name', flat=True))
+
+    def test_import(self):
+        stdout, stderr = self.import_recipes()
+        self.assertIn('Строка 3: неизвестный тег "dinner"', stderr)
+        self.assertIn('Создано 4 рецептов', stdout)
+        self.assertEqual(
+            self.names(), ['Рецепт 1', 'Рецепт 2', 'Рецепт 4', 'Рецепт 5'])
+        amount = RecipeIngredient.objects.get(recipe__name='Рецепт 5').amount
+        self.assertEqual(amount, 5)
+        self.assertEqual(
+            Recipe.objects.get(name='Рецепт 1').tags.count(), 2)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).recipes_count, 4)
+
+    def test_resume_after_failure(self):
+        with mock.patch(
+                'api.management.commands.import_recipes.fan_out',
+                side_effect=[None, RuntimeError]):
+            with self.assertRaises(RuntimeError):
+                self.import_recipes()
+        self.assertEqual(self.names(), ['Рецепт 1', 'Рецепт 2'])
+        stdout, _ = self.import_recipes()
+        self.assertIn('Продолжение импорта со строки 3', stdout)
+        self.assertEqual(
+            self.names(), ['Рецепт 1', 'Рецепт 2', 'Рецепт 4', 'Рецепт 5'])
+        self.import_recipes()
+        self.assertEqual(Recipe.objects.count(), 4)
@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from recipes.models import Ingredient
+from .base import FoodgramTestCase
+
+
+class IngredientSearchTests(FoodgramTestCase):
+    """Поиск Ингредиентов по названию: ?name=."""
+
+    def setUp(self):
+        super().setUp()
+        self.extra = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Сушеный банан', 'Бананы', 'Ёжевика')
+        ]
+
+    def names(self, **params):
+        response = self.client.get('/api/ingredients/', params)
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(self.names(name='БАН'),
+                         ['Банан', 'Бананы', 'Сушеный банан'])
+
+    def test_yo_and_case_are_ignored(self):
+        self.assertEqual(self.names(name='ежев'), ['Ёжевика'])
+
+    def test_nothing_found(self):
+        self.assertEqual(self.names(name='Кокос'), [])
+
+    def test_detail_ignores_name(self):
+        ingredient = self.ingredients[0]
+        response = self.client.get(
+            f'/api/ingredients/{ingredient.id}/', {'name': 'Банан'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], ingredient.name)
+
+    def test_new_ingredient_is_found(self):
+        self.names(name='Кокос')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Кокос', measurement_unit='г')
+        self.assertEqual(self.names(name='Кокос'), ['Кокос'])
+
+
+class ImportIngredientsTests(FoodgramTestCase):
+    """Импорт Ингредиентов из CSV и JSON пачками."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_csv_skips_existing_and_duplicates(self):
+        path = self.write(
+            'ingredients.csv',
+            'Абрикос,г\nКокос,г\nКокос,г\nКокос,шт\nЛимон,г\n')
+        stdout = StringIO()
+        call_command('import_csv', path, batch_size=2, stdout=stdout)
+        self.assertIn('Добавлено 3 записей', stdout.getvalue())
+        self.assertEqual(
+            Ingredient.objects.filter(name='Кокос').count(), 2)
+        self.assertEqual(Ingredient.objects.count(), 8)
+
+    def test_json(self):
+        path = self.write('ingredients.json', json.dumps(
+            [{'name': 'Кокос', 'measurement_unit': 'г'}]))
+        call_command('import_csv', path, stdout=StringIO())
+        self.assertTrue(Ingredient.objects.filter(name='Кокос').exists())
+
+    def test_cached_list_is_refreshed(self):
+        self.client.get('/api/ingredients/')
+        path = self.write('ingredients.csv', 'Кокос,г\n')
+        call_command('import_csv', path, stdout=StringIO())
+        names = [ingredient['name'] for ingredient in
+                 self.client.get('/api/ingredients/').json()]
+        self.assertIn('Кокос', names)
+
+    def test_unsupported_format(self):
+        path = self.write('ingredients.txt', 'Кокос,г\n')
+        with self.assertRaises(CommandError):
+            call_command('import_csv', path, stdout=StringIO())
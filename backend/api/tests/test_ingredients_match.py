@@ -0,0 +1,59 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import FoodgramTestCase
+
+
+class MatchIngredientsTests(FoodgramTestCase):
+    """Подбор Рецептов из имеющихся ингредиентов: ?ingredients=."""
+
+    def setUp(self):
+        super().setUp()
+        first, second, third, fourth = self.ingredients[:4]
+        self.full = self.create_recipe(amounts={first: 1, second: 1})
+        self.half = self.create_recipe(
+            amounts={first: 1, second: 1, third: 1, fourth: 1},
+            tags=(self.lunch,))
+        self.missing = self.create_recipe(amounts={third: 1})
+        self.foreign = self.create_recipe(
+            author=self.other, amounts={first: 1})
+
+    def match(self, **params):
+        ids = ','.join(str(ingredient.id)
+                       for ingredient in self.ingredients[:2])
+        return self.client.get('/api/recipes/', {'ingredients': ids,
+                                                 **params})
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_ranked_by_coverage(self):
+        self.assertEqual(
+            self.ids(self.match()),
+            [self.foreign.id, self.full.id, self.half.id])
+
+    def test_combined_with_other_filters(self):
+        self.assertEqual(
+            self.ids(self.match(author=self.author.id)),
+            [self.full.id, self.half.id])
+        self.assertEqual(
+            self.ids(self.match(tags='lunch')), [self.half.id])
+
+    def test_all_matches_are_counted(self):
+        for _ in range(10):
+            self.create_recipe(amounts={self.ingredients[1]: 1})
+        response = self.match(limit=100)
+        self.assertEqual(response.json()['count'], 13)
+        self.assertEqual(len(self.ids(response)), 13)
+
+    def test_queries_do_not_grow_with_matches(self):
+        self.match(limit=100)
+        with CaptureQueriesContext(connection) as few:
+            self.match(limit=100)
+        for _ in range(10):
+            self.create_recipe(amounts={self.ingredients[0]: 1})
+        self.match(limit=100)
+        with CaptureQueriesContext(connection) as many:
+            self.match(limit=100)
+        self.assertEqual(len(many), len(few))
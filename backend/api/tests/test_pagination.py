@@ -0,0 +1,84 @@
+import unittest
+from importlib import import_module
+
+from django.db import connection
+
+from api.search import POSTGRES_SEARCH_VECTOR
+from .base import FoodgramTestCase
+
+search_migration = import_module(
+    'recipes.migrations.0004_recipe_search_index')
+
+
+class KeysetPaginationTests(FoodgramTestCase):
+    """Страницы Рецептов в режиме курсора: ?cursor=."""
+
+    def setUp(self):
+        super().setUp()
+        first, second, third = self.ingredients[:3]
+        self.recipes = [
+            self.create_recipe(name='Борщ', text='Суп',
+                               amounts={first: 1}),
+            self.create_recipe(name='Щи', text='Почти борщ',
+                               amounts={first: 1, second: 1}),
+            self.create_recipe(name='Борщ зеленый', text='Щавель',
+                               amounts={first: 1, second: 1, third: 1}),
+            self.create_recipe(name='Рассольник', text='Без борща',
+                               amounts={second: 1}),
+            self.create_recipe(name='Борщ холодный', text='Свекла',
+                               amounts={first: 1, third: 1}),
+        ]
+
+    def walk(self, **params):
+        """Идентификаторы Рецептов со всех страниц по ссылкам next."""
+        response = self.client.get(
+            '/api/recipes/', {'cursor': '', 'limit': 2, **params})
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertNotIn('count', data)
+            ids += [recipe['id'] for recipe in data['results']]
+            if data['next'] is None:
+                return ids
+            response = self.client.get(data['next'])
+
+    def ordered(self, **params):
+        """Идентификаторы Рецептов одной страницей без курсора."""
+        response = self.client.get('/api/recipes/', {'limit': 100, **params})
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_newest_first(self):
+        self.assertEqual(
+            self.walk(), [recipe.id for recipe in reversed(self.recipes)])
+
+    def test_search_keeps_rank_order(self):
+        ranked = self.ordered(search='борщ')
+        self.assertEqual(len(ranked), 5)
+        self.assertNotEqual(ranked, sorted(ranked, reverse=True))
+        self.assertEqual(self.walk(search='борщ'), ranked)
+
+    def test_ingredients_keep_coverage_order(self):
+        ids = ','.join(str(ingredient.id)
+                       for ingredient in self.ingredients[1:3])
+        ranked = self.ordered(ingredients=ids)
+        self.assertEqual(ranked, [
+            self.recipes[index].id for index in (3, 2, 4, 1)])
+        self.assertEqual(self.walk(ingredients=ids), ranked)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/', {'cursor': 'bad'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_postgres_search_uses_index(self):
+        """Выражение поиска совпадает с выражением GIN-индекса."""
+        self.assertIn(
+            POSTGRES_SEARCH_VECTOR.replace('recipes_recipe.', ''),
+            search_migration.POSTGRES_FORWARD[1])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql',
+                         'Поиск по tsvector есть только в PostgreSQL.')
+    def test_postgres_search(self):
+        ranked = self.ordered(search='борщ')
+        self.assertEqual(ranked[0], self.recipes[-1].id)
+        self.assertEqual(self.walk(search='борщ'), ranked)
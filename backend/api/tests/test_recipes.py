@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import RecipeIngredient, ShoppingList
+from .base import FoodgramTestCase
+
+
+class RecipeUpdateTests(FoodgramTestCase):
+    """Изменение Рецепта записывает только разницу ингредиентов и тегов."""
+
+    def setUp(self):
+        super().setUp()
+        first, second, third = self.ingredients[:3]
+        self.recipe = self.create_recipe(
+            amounts={first: 1, second: 2, third: 3})
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.client.force_authenticate(self.author)
+
+    def update(self, amounts, tags):
+        response = self.client.put(
+            f'/api/recipes/{self.recipe.id}/',
+            self.recipe_payload(amounts=amounts, tags=tags), format='json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def amounts(self, queryset):
+        return dict(queryset.values_list('ingredient_id', 'amount'))
+
+    def test_only_changes_are_written(self):
+        first, second, third, fourth = self.ingredients[:4]
+        self.update({second: 5, third: 3, fourth: 1}, (self.lunch,))
+        expected = {second.id: 5, third.id: 3, fourth.id: 1}
+        self.assertEqual(self.amounts(
+            RecipeIngredient.objects.filter(recipe=self.recipe)), expected)
+        self.assertEqual(self.amounts(
+            ShoppingList.objects.filter(user=self.user)), expected)
+        self.assertEqual(
+            list(self.recipe.tags.values_list('id', flat=True)),
+            [self.lunch.id])
+        self.recipe.refresh_from_db()
+        self.assertIsNotNone(self.recipe.features_changed_at)
+
+    def test_amount_change_keeps_features(self):
+        first, second, third = self.ingredients[:3]
+        self.update({first: 1, second: 2, third: 30}, (self.breakfast,))
+        self.recipe.refresh_from_db()
+        self.assertIsNone(self.recipe.features_changed_at)
+
+    def test_queries_do_not_depend_on_changes(self):
+        first, second, third, fourth, fifth = self.ingredients
+        with self.assertNumQueries(22):
+            self.update({second: 5, fourth: 1}, (self.lunch,))
+        with self.assertNumQueries(22):
+            self.update({first: 2, second: 1, third: 4, fifth: 7},
+                        (self.breakfast,))
+
+
+class RecipeListTests(FoodgramTestCase):
+    """Список Рецептов с флагами Избранного и Корзины."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [self.create_recipe() for _ in range(3)]
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/recipes/{self.recipes[0].id}/favorite/')
+        self.client.post(
+            f'/api/recipes/{self.recipes[1].id}/shopping_cart/')
+
+    def flags(self, user=None):
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/recipes/')
+        return {
+            recipe['id']: (recipe['is_favorited'],
+                           recipe['is_in_shopping_cart'])
+            for recipe in response.json()['results']
+        }
+
+    def test_flags_are_per_user(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        self.assertEqual(self.flags(self.user), {
+            first: (True, False),
+            second: (False, True),
+            third: (False, False),
+        })
+        self.assertEqual(set(self.flags(self.other).values()),
+                         {(False, False)})
+        self.assertEqual(set(self.flags().values()), {(False, False)})
+
+    def test_queries_do_not_grow_with_page(self):
+        counts = []
+        for _ in range(2):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/recipes/', {'limit': 100})
+            counts.append(len(queries))
+            for ingredient in self.ingredients[1:]:
+                self.create_recipe(amounts={ingredient: 1},
+                                   tags=(self.breakfast, self.lunch))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_retrieve_query_count(self):
+        recipe = self.create_recipe(
+            amounts={ingredient: 1 for ingredient in self.ingredients},
+            tags=(self.breakfast, self.lunch))
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(len(response.json()['ingredients']), 5)
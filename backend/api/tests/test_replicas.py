@@ -0,0 +1,35 @@
+from django.core.cache import cache
+
+from api.cache import recipe_cache_key
+from api.serializers import RecipeReadSerializer
+from foodgram.routers import current_replica
+from recipes.models import Recipe
+from .base import FoodgramTestCase
+
+
+class ReplicaCacheFillTests(FoodgramTestCase):
+    """Кэш представлений заполняется данными основной БД."""
+
+    def test_cache_miss_rerenders_from_primary(self):
+        recipe = self.create_recipe()
+        stale = Recipe.objects.get(pk=recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).update(name='Новое название')
+        token = current_replica.set('missing_replica')
+        try:
+            data = RecipeReadSerializer([stale], many=True).data
+        finally:
+            current_replica.reset(token)
+        self.assertEqual(data[0]['name'], 'Новое название')
+        self.assertEqual(
+            cache.get(recipe_cache_key(recipe.id))['name'], 'Новое название')
+
+    def test_recipe_missing_on_primary_is_skipped(self):
+        recipe = self.create_recipe()
+        stale = Recipe.objects.get(pk=recipe.pk)
+        recipe.delete()
+        token = current_replica.set('missing_replica')
+        try:
+            data = RecipeReadSerializer([stale], many=True).data
+        finally:
+            current_replica.reset(token)
+        self.assertEqual(data, [])
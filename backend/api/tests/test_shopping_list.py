@@ -0,0 +1,94 @@
+import csv
+import os
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from recipes.models import ShoppingList
+
+from .base import FoodgramTestCase
+
+
+class DownloadShoppingCartTests(FoodgramTestCase):
+    """Скачивание списка покупок потоком, без временных файлов."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        apricot, banana = self.ingredients[:2]
+        for amounts in ({apricot: 100}, {apricot: 50, banana: 2}):
+            recipe = self.create_recipe(amounts=amounts)
+            self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+
+    def download(self):
+        return self.client.get('/api/recipes/download_shopping_cart/')
+
+    def test_rows_are_aggregated(self):
+        response = self.download()
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(StringIO(
+            b''.join(response.streaming_content).decode())))
+        self.assertEqual(
+            rows[0], ['Ингредиент', 'Количество', 'Единица измерения'])
+        self.assertEqual(sorted(rows[1:]),
+                         [['Абрикос', '150', 'г'], ['Банан', '2', 'г']])
+
+    def test_filename_is_per_user(self):
+        self.assertIn(f'shopping_cart_{self.user.id}.csv',
+                      self.download()['Content-Disposition'])
+
+    def test_no_file_is_written(self):
+        b''.join(self.download().streaming_content)
+        self.assertFalse(os.path.exists('recipe.csv'))
+
+    def test_empty_cart_has_header_only(self):
+        self.client.force_authenticate(self.other)
+        content = b''.join(self.download().streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 1)
+
+
+class ShoppingListTests(FoodgramTestCase):
+    """Список покупок обновляется вместе с Корзиной и Рецептами."""
+
+    def setUp(self):
+        super().setUp()
+        self.apricot, self.banana, self.cherry = self.ingredients[:3]
+        self.recipe = self.create_recipe(
+            amounts={self.apricot: 100, self.banana: 2})
+        self.client.force_authenticate(self.user)
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+    def shopping_list(self):
+        response = self.client.get('/api/recipes/shopping_list/')
+        return {item['name']: item['amount'] for item in response.json()}
+
+    def test_cart_changes_list(self):
+        self.assertEqual(self.shopping_list(), {'Абрикос': 100, 'Банан': 2})
+        self.client.delete(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.assertEqual(self.shopping_list(), {})
+
+    def test_recipe_update_changes_list(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.put(
+            f'/api/recipes/{self.recipe.id}/',
+            self.recipe_payload(amounts={self.apricot: 30, self.cherry: 5}),
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.shopping_list(), {'Абрикос': 30, 'Вишня': 5})
+
+    def test_recipe_delete_changes_list(self):
+        self.client.force_authenticate(self.author)
+        self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.shopping_list(), {})
+
+    def test_rebuild_command(self):
+        call_command('rebuild_shopping_lists', '--check', stdout=StringIO())
+        ShoppingList.objects.filter(user=self.user).update(amount=1)
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_shopping_lists', '--check', stdout=StringIO())
+        call_command('rebuild_shopping_lists', stdout=StringIO())
+        self.assertEqual(self.shopping_list(), {'Абрикос': 100, 'Банан': 2})
@@ -0,0 +1,83 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from api.recommendations import RecipeSimilarity
+from recipes.models import Favorite, Recipe, SimilarRecipe
+from .base import FoodgramTestCase
+
+
+class SimilarRecipesTests(FoodgramTestCase):
+    """Расчет похожих Рецептов и их пересчет после изменений.
+
+    Признак считается частым, если он есть больше чем у двух Рецептов,
+    поэтому общий тег не делает все Рецепты кандидатами.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch(
+            'api.recommendations.SIMILAR_MAX_FEATURE_RECIPES', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ingredients = self.ingredients
+        self.first = self.create_recipe(
+            amounts={ingredients[0]: 1, ingredients[1]: 1})
+        self.second = self.create_recipe(
+            amounts={ingredients[1]: 1, ingredients[2]: 1})
+        self.third = self.create_recipe(amounts={ingredients[3]: 1})
+        self.fourth = self.create_recipe(amounts={ingredients[4]: 1})
+        Favorite.objects.bulk_create([
+            Favorite(user=self.user, recipe=self.first),
+            Favorite(user=self.user, recipe=self.third),
+            Favorite(user=self.other, recipe=self.third),
+            Favorite(user=self.other, recipe=self.fourth),
+        ])
+        call_command('build_similar_recipes', stdout=StringIO())
+
+    def similar(self, recipe):
+        return list(SimilarRecipe.objects.filter(
+            recipe=recipe).values_list('similar_id', flat=True))
+
+    def test_partial_load_matches_full(self):
+        full = RecipeSimilarity()
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                RecipeSimilarity((recipe.id,)).neighbours(recipe.id, 10),
+                full.neighbours(recipe.id, 10))
+
+    def test_partial_load_skips_unrelated_rows(self):
+        similarity = RecipeSimilarity((self.second.id,))
+        self.assertEqual(similarity.features[self.first.id], {
+            ('ingredient', self.ingredients[0].id),
+            ('ingredient', self.ingredients[1].id),
+            ('tag', self.breakfast.id),
+        })
+        self.assertNotIn(self.third.id, similarity.features)
+        self.assertNotIn(self.fourth.id, similarity.users)
+
+    def test_ingredient_edit_refreshes_neighbours(self):
+        self.assertEqual(
+            self.similar(self.first), [self.third.id, self.second.id])
+        self.client.force_authenticate(self.author)
+        response = self.client.put(
+            f'/api/recipes/{self.second.id}/',
+            self.recipe_payload(amounts={self.ingredients[2]: 1}),
+            format='json')
+        self.assertEqual(response.status_code, 200)
+        self.second.refresh_from_db()
+        self.assertIsNotNone(self.second.features_changed_at)
+        call_command('build_similar_recipes', stdout=StringIO())
+        self.assertEqual(self.similar(self.first), [self.third.id])
+
+    def test_new_recipe_enters_neighbour_lists(self):
+        recipe = self.create_recipe(amounts={self.ingredients[4]: 1})
+        call_command('build_similar_recipes', stdout=StringIO())
+        self.assertIn(recipe.id, self.similar(self.fourth))
+        self.assertIn(self.fourth.id, self.similar(recipe))
+
+    def test_unchanged_recipes_are_skipped(self):
+        output = StringIO()
+        call_command('build_similar_recipes', stdout=output)
+        self.assertIn('актуальны', output.getvalue())
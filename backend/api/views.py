@@ -1,9 +1,12 @@
 import csv
+from itertools import chain
 
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
@@ -12,37 +15,94 @@ from rest_framework.response import Response
 
 from api.serializers import (
     IngredientSerializer,
+    RecipeBatchSerializer,
     RecipeCreateSerializer,
     RecipeReadSerializer,
     RecipeSerializer,
+    ShoppingListSerializer,
     TagSerializer,
 )
+from foodgram.constants import SHOPPING_CART_CHUNK_SIZE
+from foodgram.instrumentation import SerializerMetricsMixin, measured
+from .cache import CachedReferenceMixin
 from .filter import RecipeFilter, IngredientFilter
-from .paginations import CustomPagination
+from .paginations import CustomCursorPagination, FeedPagination
 from .permissions import IsAuthorPermission
 from recipes.models import (
     Favorite,
+    FeedEntry,
     Ingredient,
     Recipe,
     RecipeIngredient,
     ShoppingCart,
+    ShoppingList,
     Tag,
+    change_counter,
+    change_counters,
 )
+from users.models import User
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class Echo:
+    """Псевдо-буфер: csv.writer возвращает строку вместо записи в файл."""
+
+    def write(self, value):
+        return value
+
+
+class RecipeViewSet(SerializerMetricsMixin, viewsets.ModelViewSet):
     """ViewSet для Рецептов."""
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorPermission,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = CustomPagination
+    pagination_class = CustomCursorPagination
+    cursor_ordering = ('-pub_date', '-id')
+
+    def get_queryset(self):
+        """Аннотирует флаги Избранного и Корзины для всей страницы.
+
+        Для одного Рецепта автор, теги и ингредиенты загружаются заранее,
+        для изменения - только автор; список загружает их только
+        для Рецептов, которых нет в кэше.
+        """
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = queryset.select_related('author').prefetch_related(
+                'tags',
+                Prefetch(
+                    'recipes',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient')),
+            )
+        elif self.action in ('update', 'partial_update'):
+            queryset = queryset.select_related('author')
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+            )
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    @staticmethod
+    def lock_user(user):
+        """Блокирует строку Пользователя до конца транзакции.
+
+        Изменения Избранного и Корзины одного Пользователя выполняются
+        по очереди, поэтому проверка наличия Рецепта в списке остается
+        верной до записи, а счетчики не меняются дважды.
+        """
+        list(User.objects.select_for_update().filter(
+            pk=user.pk).values_list('pk', flat=True))
+
     @staticmethod
     def check_recipe(pk, request, model):
         """Вспомогательный метод проверки Рецепта в БД."""
@@ -58,28 +118,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return recipe, presence_recipe
 
     @staticmethod
+    @transaction.atomic
     def add_recipe(pk, request, model):
         """Вспомогательный метод добавления Рецепта в Избранное и Корзину."""
+        RecipeViewSet.lock_user(request.user)
         recipe, presence_recipe = RecipeViewSet.check_recipe(
             pk, request, model
         )
-        serializer = RecipeSerializer(
+        serializer = measured(RecipeSerializer(
             recipe,
             data=request.data,
-            context={'request': request})
+            context={'request': request}))
         serializer.is_valid(raise_exception=True)
         if presence_recipe:
             return Response(
                 {'errors': 'Данный рецепт уже добавлен!'},
                 status=status.HTTP_400_BAD_REQUEST)
         model.objects.create(user=request.user, recipe=recipe)
+        change_counter(
+            Recipe, recipe.id, model.recipe_counter, 1,
+            interactions_changed_at=timezone.now())
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED)
 
     @staticmethod
+    @transaction.atomic
     def delete_recipe(pk, request, model):
         """Вспомогательный метод удаления Рецепта из Избранного и Корзины."""
+        RecipeViewSet.lock_user(request.user)
         recipe, presence_recipe = RecipeViewSet.check_recipe(
             pk, request, model
         )
@@ -94,10 +161,70 @@ class RecipeViewSet(viewsets.ModelViewSet):
             recipe=recipe
         )
         delete_recipe.delete()
+        change_counter(
+            Recipe, recipe.id, model.recipe_counter, -1,
+            interactions_changed_at=timezone.now())
         return Response(
             {'detail': 'Рецепт удален.'},
             status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def check_recipes(ids, user, model):
+        """Проверка списка Рецептов одним запросом.
+
+        Возвращает {id: есть ли Рецепт в списке} для существующих Рецептов.
+        """
+        return dict(Recipe.objects.filter(pk__in=ids).annotate(
+            presence=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        ).values_list('id', 'presence'))
+
+    @staticmethod
+    @transaction.atomic
+    def batch_recipes(request, model, sign):
+        """Вспомогательный метод пакетного добавления (sign=1) и удаления
+        (sign=-1) Рецептов в Избранном и Корзине.
+
+        Возвращает ответ с результатом по каждому id и список id,
+        которые действительно были добавлены или удалены. Наличие
+        Рецептов проверяется под блокировкой Пользователя, поэтому
+        повторный или параллельный запрос не изменит счетчики дважды.
+        """
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        RecipeViewSet.lock_user(user)
+        presence = RecipeViewSet.check_recipes(ids, user, model)
+        adding = sign > 0
+        changed = [
+            pk for pk in ids if pk in presence and presence[pk] != adding]
+        if adding:
+            model.objects.bulk_create(
+                [model(user=user, recipe_id=pk) for pk in changed])
+        else:
+            model.objects.filter(user=user, recipe_id__in=changed).delete()
+        change_counters(
+            Recipe, changed, model.recipe_counter, sign,
+            interactions_changed_at=timezone.now())
+        if adding:
+            done, error = 'added', 'Данный рецепт уже добавлен!'
+        else:
+            done, error = ('deleted', 'Рецепт нельзя удалить, '
+                                      'поскольку его нет в списке!')
+        results = []
+        for pk in ids:
+            if pk not in presence:
+                results.append({
+                    'id': pk,
+                    'errors': f'Недопустимый первичный ключ "{pk}" '
+                              f'- объект не существует.'})
+            elif presence[pk] == adding:
+                results.append({'id': pk, 'errors': error})
+            else:
+                results.append({'id': pk, 'status': done})
+        return Response({'results': results}), changed
+
     @action(methods=['post'],
             detail=True,
             permission_classes=(IsAuthenticated,))
@@ -115,39 +242,154 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,))
     def shopping_cart(self, request, pk=None):
         """Добавить рецепт в Корзину."""
-        return self.add_recipe(pk, request, ShoppingCart)
+        with transaction.atomic():
+            response = self.add_recipe(pk, request, ShoppingCart)
+            if response.status_code == status.HTTP_201_CREATED:
+                ShoppingList.apply(
+                    (request.user.id,), ShoppingList.recipe_amounts(pk))
+        return response
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk=None):
         """Удалить рецепт из Корзины."""
-        return self.delete_recipe(pk, request, ShoppingCart)
+        with transaction.atomic():
+            response = self.delete_recipe(pk, request, ShoppingCart)
+            if response.status_code == status.HTTP_204_NO_CONTENT:
+                ShoppingList.apply(
+                    (request.user.id,), ShoppingList.recipe_amounts(pk), -1)
+        return response
+
+    @action(methods=['post'],
+            detail=False,
+            url_path='favorite/batch',
+            permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request):
+        """Добавить в Избранное список Рецептов."""
+        response, _ = self.batch_recipes(request, Favorite, 1)
+        return response
+
+    @favorite_batch.mapping.delete
+    def delete_favorite_batch(self, request):
+        """Удалить из Избранного список Рецептов."""
+        response, _ = self.batch_recipes(request, Favorite, -1)
+        return response
+
+    @action(methods=['post'],
+            detail=False,
+            url_path='shopping_cart/batch',
+            permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        """Добавить в Корзину список Рецептов."""
+        with transaction.atomic():
+            response, added = self.batch_recipes(request, ShoppingCart, 1)
+            ShoppingList.apply(
+                (request.user.id,), ShoppingList.recipes_amounts(added))
+        return response
+
+    @shopping_cart_batch.mapping.delete
+    def delete_shopping_cart_batch(self, request):
+        """Удалить из Корзины список Рецептов."""
+        with transaction.atomic():
+            response, deleted = self.batch_recipes(
+                request, ShoppingCart, -1)
+            ShoppingList.apply(
+                (request.user.id,), ShoppingList.recipes_amounts(deleted), -1)
+        return response
+
+    @action(methods=['delete'],
+            detail=False,
+            url_path='shopping_cart',
+            permission_classes=(IsAuthenticated,))
+    def clear_shopping_cart(self, request):
+        """Очистить Корзину."""
+        cart = ShoppingCart.objects.filter(user=request.user)
+        with transaction.atomic():
+            self.lock_user(request.user)
+            recipe_ids = list(cart.values_list('recipe_id', flat=True))
+            cart.delete()
+            change_counters(
+                Recipe, recipe_ids, 'in_carts_count', -1,
+                interactions_changed_at=timezone.now())
+            ShoppingList.objects.filter(user=request.user).delete()
+        return Response(
+            {'detail': 'Корзина очищена.'},
+            status=status.HTTP_204_NO_CONTENT)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingList.apply(
+            ShoppingCart.objects.filter(
+                recipe=instance).values_list('user_id', flat=True),
+            ShoppingList.recipe_amounts(instance.id),
+            -1
+        )
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+        instance.delete()
+
+    @action(methods=['get'],
+            detail=True,
+            permission_classes=(AllowAny,))
+    def similar(self, request, pk=None):
+        """Похожие Рецепты из предрассчитанного списка."""
+        recipes = self.get_queryset().filter(
+            similar_to__recipe_id=pk).order_by('-similar_to__score')
+        serializer = self.get_serializer(recipes, many=True)
+        if not serializer.data:
+            get_object_or_404(Recipe, id=pk)
+        return Response(serializer.data)
+
+    @action(methods=['get'],
+            detail=False,
+            permission_classes=(IsAuthenticated,),
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Лента Рецептов авторов из подписок, новые сначала."""
+        entries = self.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user))
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in entries])
+        serializer = self.get_serializer(
+            [recipes[entry.recipe_id] for entry in entries
+             if entry.recipe_id in recipes],
+            many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['get'],
+            detail=False,
+            permission_classes=(IsAuthenticated,))
+    def shopping_list(self, request):
+        """Список покупок в формате JSON."""
+        items = ShoppingList.objects.filter(
+            user=request.user).select_related('ingredient')
+        serializer = measured(ShoppingListSerializer(items, many=True))
+        return Response(serializer.data)
 
     @action(methods=['get'],
             detail=False,
             permission_classes=(IsAuthenticated,))
     def download_shopping_cart(self, request):
         """Скачать список покупок."""
-        ingredients_obj = RecipeIngredient.objects.filter(
-            recipe__recipes_in_cart__user=request.user
-        ).values('ingredient'
-                 ).annotate(total_amount=Sum('amount')
-                            ).values_list('ingredient__name',
-                                          'total_amount',
-                                          'ingredient__measurement_unit')
-        data = [ingredients for ingredients in ingredients_obj]
-
-        filename = 'recipe.csv'
-        with open(filename, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(['Ингредиент', 'Количество', 'Единица измерения'])
-            writer.writerows(data)
-
-        response = HttpResponse(open(filename, 'rb'), content_type='text/csv')
+        ingredients_obj = ShoppingList.objects.filter(
+            user=request.user
+        ).values_list('ingredient__name',
+                      'amount',
+                      'ingredient__measurement_unit')
+        rows = chain(
+            (('Ингредиент', 'Количество', 'Единица измерения'),),
+            ingredients_obj.iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+        )
+        writer = csv.writer(Echo())
+
+        filename = f'shopping_cart_{request.user.id}.csv'
+        response = StreamingHttpResponse(
+            (writer.writerow(row) for row in rows),
+            content_type='text/csv')
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CachedReferenceMixin, SerializerMetricsMixin,
+                 viewsets.ModelViewSet):
     """ViewSet для Тега."""
     queryset = Tag.objects.all()
     permission_classes = (AllowAny,)
@@ -155,7 +397,8 @@ class TagViewSet(viewsets.ModelViewSet):
     http_method_names = ('get',)
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CachedReferenceMixin, SerializerMetricsMixin,
+                        viewsets.ModelViewSet):
     """ViewSet для Ингредиента."""
     queryset = Ingredient.objects.all()
     permission_classes = (AllowAny,)
@@ -0,0 +1,23 @@
+import random
+
+from django.core.cache.backends import filebased
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """Файловый кэш, который проверяет размер каталога не при каждой записи.
+
+    Стандартный бэкенд при каждом set перечисляет все файлы каталога,
+    чтобы сравнить их число с MAX_ENTRIES. Здесь проверка выполняется
+    в среднем раз в OPTIONS['CULL_CHECK_INTERVAL'] записей, поэтому
+    число файлов может ненадолго превысить MAX_ENTRIES.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._cull_check_interval = int(
+            options.get('CULL_CHECK_INTERVAL', 1))
+
+    def _cull(self):
+        if random.randrange(self._cull_check_interval) == 0:
+            super()._cull()
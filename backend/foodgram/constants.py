@@ -7,3 +7,26 @@ USERNAME_LENGTH = 150
 FIRST_NAME_LENGTH = 150
 LAST_NAME_LENGTH = 150
 PAGE_SIZE = 6
+SHOPPING_CART_CHUNK_SIZE = 2000
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TTL = 300
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+IMAGE_VARIANTS = {
+    'thumb': (320, 320),
+    'medium': (800, 800),
+}
+IMAGE_VARIANT_FORMAT = 'WEBP'
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_WORKERS = 2
+RECIPE_BATCH_SIZE = 100
+FEED_BACKFILL_SIZE = 100
+FEED_SYNC_FOLLOWERS = 1000
+FEED_BATCH_SIZE = 5000
+SIMILAR_RECIPES_COUNT = 10
+SIMILAR_INTERACTION_WEIGHT = 0.7
+SIMILAR_MAX_FEATURE_RECIPES = 1000
+SIMILAR_BATCH_SIZE = 500
+AUTH_CACHE_SIZE = 10000
+AUTH_CACHE_TTL = 60
+AUTH_CACHE_STATS_INTERVAL = 1000
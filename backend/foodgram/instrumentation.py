@@ -0,0 +1,182 @@
+import json
+import logging
+import random
+import time
+import traceback
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('foodgram.metrics')
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+STACK_EXCERPT_DEPTH = 5
+
+
+class RequestMetrics:
+    """Счетчики одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.view = None
+
+
+def view_name(request):
+    """Имя представления: ViewSet.action или имя маршрута."""
+    match = request.resolver_match
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    if view_class is not None and action:
+        return f'{view_class.__name__}.{action}'
+    return match.view_name
+
+
+def stack_excerpt():
+    """Последние кадры стека из кода проекта."""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+    return [
+        f'{frame.filename[len(base_dir) + 1:]}:{frame.lineno} '
+        f'in {frame.name}'
+        for frame in frames[-STACK_EXCERPT_DEPTH:]
+    ]
+
+
+def measure_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += duration
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'view': metrics.view,
+                'duration_ms': round(duration * 1000, 1),
+                'sql': sql[:1000],
+                'stack': stack_excerpt(),
+            }, ensure_ascii=False))
+
+
+class MeasuredData:
+    """Замер времени .data сериализатора для метрик запроса.
+
+    Время вложенных вызовов .data учитывается один раз.
+    """
+
+    @property
+    def data(self):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().data
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_time += time.perf_counter() - started
+
+
+measured_classes = {}
+
+
+def measured(serializer):
+    """Тот же сериализатор с замером времени .data.
+
+    Подкласс с MeasuredData создается один раз для каждого класса
+    сериализатора; остальные сериализаторы не меняются.
+    """
+    serializer_class = type(serializer)
+    if not issubclass(serializer_class, MeasuredData):
+        if serializer_class not in measured_classes:
+            measured_classes[serializer_class] = type(
+                serializer_class.__name__,
+                (MeasuredData, serializer_class), {})
+        serializer.__class__ = measured_classes[serializer_class]
+    return serializer
+
+
+class SerializerMetricsMixin:
+    """Учитывает время сериализаторов get_serializer в метриках запроса."""
+
+    def get_serializer(self, *args, **kwargs):
+        return measured(super().get_serializer(*args, **kwargs))
+
+
+class RequestMetricsMiddleware:
+    """Считает запросы к БД, время БД, сериализаторов и всего запроса.
+
+    Медленные запросы к БД (от SLOW_QUERY_MS мс) пишутся в лог
+    с представлением и фрагментом стека. Для доли запросов
+    REQUEST_METRICS_SAMPLE_RATE метрики отдаются в заголовке
+    Server-Timing и пишутся в лог foodgram.metrics строкой JSON.
+    Время сериализаторов замеряют представления
+    с SerializerMetricsMixin.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(measure_query))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        if random.random() < settings.REQUEST_METRICS_SAMPLE_RATE:
+            self.report(request, response, metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.view = view_name(request)
+
+    @staticmethod
+    def report(request, response, metrics):
+        total = (time.perf_counter() - metrics.started) * 1000
+        db_time = metrics.db_time * 1000
+        serializer_time = metrics.serializer_time * 1000
+        response['Server-Timing'] = (
+            f'db;dur={db_time:.1f};desc="{metrics.queries} queries", '
+            f'serializer;dur={serializer_time:.1f}, '
+            f'total;dur={total:.1f}'
+        )
+        logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'view': metrics.view,
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'db_ms': round(db_time, 1),
+            'serializer_ms': round(serializer_time, 1),
+            'total_ms': round(total, 1),
+        }, ensure_ascii=False))
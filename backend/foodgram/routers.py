@@ -0,0 +1,109 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+current_replica = ContextVar('current_replica', default=None)
+
+# Данные входа всегда читаются с основной БД: только что выданный токен
+# или сессия могли еще не дойти до реплики.
+PRIMARY_ONLY_APPS = ('authtoken', 'sessions')
+
+PRIMARY_PIN_COOKIE = 'db_primary_pin'
+PRIMARY_PIN_SALT = 'foodgram.routers.primary_pin'
+
+
+class PrimaryReplicaRouter:
+    """Направляет чтение запроса на реплику, выбранную
+    ReadReplicaMiddleware, а запись - на основную БД."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return 'default'
+        return current_replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+@contextmanager
+def read_primary():
+    """Чтение с основной БД внутри блока.
+
+    Нужно, когда прочитанные данные сохраняются в общий кэш: отстающая
+    реплика иначе вернула бы в кэш уже измененные данные.
+    """
+    token = current_replica.set(None)
+    try:
+        yield
+    finally:
+        current_replica.reset(token)
+
+
+def is_pinned(request):
+    """Клиент недавно изменял данные и читает с основной БД."""
+    return request.get_signed_cookie(
+        PRIMARY_PIN_COOKIE,
+        default=None,
+        salt=PRIMARY_PIN_SALT,
+        max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+    ) is not None
+
+
+def stream_from(content, replica):
+    """Отдает потоковый ответ, читая данные с той же реплики."""
+    iterator = iter(content)
+    while True:
+        token = current_replica.set(replica)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            current_replica.reset(token)
+        yield chunk
+
+
+class ReadReplicaMiddleware:
+    """Выбирает БД для чтения на время запроса.
+
+    Безопасные запросы читают с одной из реплик DATABASE_REPLICAS.
+    После изменяющего запроса клиент на DATABASE_PRIMARY_PIN_SECONDS
+    секунд закрепляется за основной БД, чтобы видеть свои изменения.
+    Закрепление хранится в подписанной cookie, поэтому действует
+    во всех процессах без общего кэша.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return self.get_response(request)
+        replica = None
+        if request.method in SAFE_METHODS and not is_pinned(request):
+            replica = random.choice(replicas)
+        token = current_replica.set(replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        if request.method not in SAFE_METHODS:
+            response.set_signed_cookie(
+                PRIMARY_PIN_COOKIE,
+                '1',
+                salt=PRIMARY_PIN_SALT,
+                max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        if replica and response.streaming:
+            response.streaming_content = stream_from(
+                response.streaming_content, replica)
+        return response
@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,7 +29,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.routers.ReadReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -43,7 +47,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -101,6 +105,44 @@ else:
         }
     }
 
+# Реплики для чтения: хосты PostgreSQL или файлы SQLite через запятую.
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1):
+    alias = f'replica_{number}'
+    location_key = (
+        'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+        else 'HOST')
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        location_key: location.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.routers.PrimaryReplicaRouter']
+
+DATABASE_PRIMARY_PIN_SECONDS = int(
+    os.getenv('DB_PRIMARY_PIN_SECONDS', 10))
+
+# Кэш общий для всех процессов: версии справочников и представления
+# Рецептов сбрасываются из любого воркера и из management-команд.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'foodgram.cache.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'foodgram_cache')),
+    }
+}
+
+if CACHES['default']['BACKEND'] == 'foodgram.cache.FileBasedCache':
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+        'CULL_FREQUENCY': 10,
+        'CULL_CHECK_INTERVAL': 1000,
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -132,4 +174,47 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'foodgram.storage.ContentAddressedStorage'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Доля запросов с заголовком Server-Timing и строкой метрик в логе.
+REQUEST_METRICS_SAMPLE_RATE = float(os.getenv(
+    'REQUEST_METRICS_SAMPLE_RATE', 1 if DEBUG else 0.05))
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+
+# Повторять при первом запросе процесса фоновые задачи, потерянные
+# при перезапуске: обработку фото и рассылку Рецептов в ленты.
+BACKGROUND_REPAIR = os.getenv('BACKGROUND_REPAIR', 'true').lower() == 'true'
+
+# manage.py test не выводит метрики запросов.
+TESTING = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'null': {
+            'class': 'logging.NullHandler',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'foodgram': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'foodgram.metrics': {
+            'handlers': ['null' if TESTING else 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище медиафайлов, в котором имя файла - хеш его содержимого.
+
+    Одинаковые файлы хранятся один раз, а файл по своему адресу никогда
+    не перезаписывается, поэтому его можно кешировать бессрочно.
+    Файл записывается во временный и переносится на свой адрес только
+    целиком, поэтому прерванная запись не оставит под хешем
+    обрезанный файл.
+    """
+
+    @staticmethod
+    def hashed_name(name, digest):
+        """Имя файла в каталоге name по хешу содержимого."""
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    @staticmethod
+    def content_digest(content):
+        checksum = hashlib.sha256()
+        for chunk in content.chunks():
+            checksum.update(chunk)
+        return checksum.hexdigest()
+
+    def get_available_name(self, name, max_length=None):
+        """Файл с тем же именем уже содержит те же данные."""
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, self.content_digest(content))
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+                file.flush()
+                os.fsync(file.fileno())
+            os.chmod(temporary_path, self.file_permissions_mode or 0o644)
+            os.replace(temporary_path, full_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        directory_descriptor = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(directory_descriptor)
+        finally:
+            os.close(directory_descriptor)
+        return name
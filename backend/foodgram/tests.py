@@ -0,0 +1,192 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+
+from api.serializers import TagSerializer
+from foodgram.cache import FileBasedCache
+from foodgram.instrumentation import (
+    MeasuredData,
+    RequestMetrics,
+    current_metrics,
+    measured,
+)
+from foodgram.routers import (
+    PRIMARY_PIN_COOKIE,
+    ReadReplicaMiddleware,
+    current_replica,
+)
+from foodgram.storage import ContentAddressedStorage
+from recipes.models import Tag
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica_1'], DATABASE_PRIMARY_PIN_SECONDS=10)
+class ReadReplicaMiddlewareTests(SimpleTestCase):
+    """Выбор БД для чтения и закрепление клиента за основной БД."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.used = []
+        self.middleware = ReadReplicaMiddleware(self.view)
+
+    def view(self, request):
+        self.used.append(current_replica.get())
+        return HttpResponse()
+
+    def request(self, method, cookies=None):
+        request = getattr(self.factory, method)('/api/recipes/')
+        request.COOKIES.update(cookies or {})
+        return self.middleware(request)
+
+    def test_safe_request_reads_replica(self):
+        response = self.request('get')
+        self.assertEqual(self.used, ['replica_1'])
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+    def test_write_pins_client_to_primary(self):
+        response = self.request('post')
+        self.assertEqual(self.used, [None])
+        cookie = response.cookies[PRIMARY_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        self.request('get', {PRIMARY_PIN_COOKIE: cookie.value})
+        self.assertEqual(self.used, [None, None])
+
+    def test_expired_pin_reads_replica(self):
+        cookie = self.request('post').cookies[PRIMARY_PIN_COOKIE]
+        with mock.patch('django.core.signing.time.time',
+                        return_value=signing.time.time() + 11):
+            self.request('get', {PRIMARY_PIN_COOKIE: cookie.value})
+        self.assertEqual(self.used, [None, 'replica_1'])
+
+    def test_forged_pin_is_ignored(self):
+        self.request('get', {PRIMARY_PIN_COOKIE: '1'})
+        self.assertEqual(self.used, ['replica_1'])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_reads_primary(self):
+        response = self.request('post')
+        self.request('get')
+        self.assertEqual(self.used, [None, None])
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """Файлы хранятся по хешу содержимого и записываются целиком."""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), self.location)
+            for directory, _, names in os.walk(self.location)
+            for name in names
+        )
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save('images/a.PNG', ContentFile(b'data'))
+        second = self.storage.save('images/b.png', ContentFile(b'data'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith('images/3a/3a6eb079'))
+        self.assertTrue(first.endswith('.png'))
+        self.assertEqual(self.stored_files(), [first])
+        with self.storage.open(first) as file:
+            self.assertEqual(file.read(), b'data')
+
+    def test_interrupted_write_leaves_no_file(self):
+        content = ContentFile(b'data')
+        with mock.patch('foodgram.storage.os.fsync', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.storage.save('images/a.png', content)
+        self.assertEqual(self.stored_files(), [])
+        name = self.storage.save('images/a.png', content)
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'data')
+
+
+class FileBasedCacheTests(SimpleTestCase):
+    """Файловый кэш ограничивает число записей без обхода на каждой."""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+
+    def cache(self, interval):
+        return FileBasedCache(self.location, {'OPTIONS': {
+            'MAX_ENTRIES': 4,
+            'CULL_FREQUENCY': 2,
+            'CULL_CHECK_INTERVAL': interval,
+        }})
+
+    def fill(self, cache, count):
+        for number in range(count):
+            cache.set(f'key:{number}', number)
+        return len(os.listdir(self.location))
+
+    def test_entries_are_culled(self):
+        self.assertLessEqual(self.fill(self.cache(1), 10), 4)
+
+    def test_directory_is_listed_once_per_interval(self):
+        cache = self.cache(5)
+        with mock.patch('foodgram.cache.random.randrange',
+                        side_effect=[1, 1, 1, 1, 0] * 2), \
+                mock.patch.object(cache, '_list_cache_files',
+                                  wraps=cache._list_cache_files) as listed:
+            self.fill(cache, 10)
+        self.assertEqual(listed.call_count, 2)
+
+
+@override_settings(
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    DATABASE_REPLICAS=[],
+    REQUEST_METRICS_SAMPLE_RATE=1,
+)
+class RequestMetricsTests(TestCase):
+    """Метрики запросов без изменения классов DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast')
+
+    def test_metrics_are_logged(self):
+        with self.assertLogs('foodgram.metrics', 'INFO') as logs:
+            response = self.client.get('/api/tags/')
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'TagViewSet.list')
+        self.assertEqual(record['queries'], 1)
+
+    def test_metrics_logger_is_silent_under_test(self):
+        handlers = logging.getLogger('foodgram.metrics').handlers
+        self.assertTrue(handlers)
+        for handler in handlers:
+            self.assertIsInstance(handler, logging.NullHandler)
+
+    def test_only_view_serializers_are_measured(self):
+        self.client.get('/api/tags/')
+        self.assertNotIsInstance(TagSerializer(self.tag), MeasuredData)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            data = measured(TagSerializer(self.tag)).data
+        finally:
+            current_metrics.reset(token)
+        self.assertEqual(data['slug'], 'breakfast')
+        self.assertGreater(metrics.serializer_time, 0)
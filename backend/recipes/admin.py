@@ -1,14 +1,19 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
 
-
+from api.cache import invalidate_recipes
 from recipes.models import (
     Recipe,
     Ingredient,
     Tag,
     RecipeIngredient,
     Favorite,
-    ShoppingCart
+    ShoppingCart,
+    ShoppingList,
+    change_counter
 )
+from users.models import User
 
 
 @admin.register(Ingredient)
@@ -23,7 +28,7 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
     )
     list_filter = (
-        'name',
+        'measurement_unit',
     )
 
 
@@ -51,6 +56,12 @@ class RecipeIngredientInline(admin.StackedInline):
     редактирования ингредиентов внутри рецепта."""
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = (
+        'ingredient',
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 @admin.register(Recipe)
@@ -68,17 +79,70 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     search_fields = (
         'name',
+        'author__username',
+        'author__email',
     )
     list_filter = (
-        'name',
-        'author',
         'tags',
     )
+    autocomplete_fields = (
+        'author',
+    )
+    show_full_result_count = False
     inlines = [RecipeIngredientInline]
 
-    @admin.display(description='Число добавлений в избранное')
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author').prefetch_related('ingredients')
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        previous_author_id = Recipe.objects.filter(pk=obj.pk).values_list(
+            'author_id', flat=True).first()
+        obj.previous_amounts = (
+            ShoppingList.recipe_amounts(obj.id) if change else {})
+        super().save_model(request, obj, form, change)
+        if previous_author_id != obj.author_id:
+            if previous_author_id is not None:
+                change_counter(
+                    User, previous_author_id, 'recipes_count', -1)
+            change_counter(User, obj.author_id, 'recipes_count', 1)
+
+    @transaction.atomic
+    def save_related(self, request, form, formsets, change):
+        """Переносит изменения ингредиентов из inline в списки покупок
+        и отмечает изменение признаков для пересчета похожих Рецептов."""
+        super().save_related(request, form, formsets, change)
+        recipe = form.instance
+        if change and ('tags' in form.changed_data or any(
+                formset.has_changed() for formset in formsets)):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                features_changed_at=timezone.now())
+        ShoppingList.apply_recipe_change(
+            recipe.id,
+            ShoppingList.recipe_amounts(recipe.id),
+            recipe.previous_amounts
+        )
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        ShoppingList.apply_recipe_change(
+            obj.id, {}, ShoppingList.recipe_amounts(obj.id))
+        change_counter(User, obj.author_id, 'recipes_count', -1)
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for recipe in queryset:
+            ShoppingList.apply_recipe_change(
+                recipe.id, {}, ShoppingList.recipe_amounts(recipe.id))
+            change_counter(User, recipe.author_id, 'recipes_count', -1)
+        super().delete_queryset(request, queryset)
+
+    @admin.display(description='Число добавлений в избранное',
+                   ordering='favorites_count')
     def is_favorites(self, obj):
-        return obj.favorites_recipe.count()
+        return obj.favorites_count
 
     @admin.display(description='Ингредиенты')
     def ingredients_list(self, obj):
@@ -96,31 +160,170 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         'amount',
     )
     search_fields = (
+        'ingredient__name',
+        'recipe__name',
+    )
+    autocomplete_fields = (
+        'recipe',
         'ingredient',
     )
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient')
+
+    @staticmethod
+    def recipes_changed(recipe_ids):
+        """Сбрасывает кэш Рецептов и отмечает изменение их признаков.
+
+        Изменения ингредиентов через API и inline Рецепта сохраняют
+        сам Рецепт, здесь Рецепт не сохраняется.
+        """
+        recipe_ids = set(recipe_ids)
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            features_changed_at=timezone.now())
+        invalidate_recipes(recipe_ids)
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        """Переносит изменение ингредиента в списки покупок."""
+        previous = RecipeIngredient.objects.filter(pk=obj.pk).first()
+        super().save_model(request, obj, form, change)
+        self.recipes_changed(
+            {obj.recipe_id, getattr(previous, 'recipe_id', obj.recipe_id)})
+        amounts = {obj.ingredient_id: obj.amount}
+        if previous is None:
+            ShoppingList.apply_recipe_change(obj.recipe_id, amounts, {})
+        elif previous.recipe_id == obj.recipe_id:
+            ShoppingList.apply_recipe_change(
+                obj.recipe_id, amounts,
+                {previous.ingredient_id: previous.amount})
+        else:
+            ShoppingList.apply_recipe_change(
+                previous.recipe_id, {},
+                {previous.ingredient_id: previous.amount})
+            ShoppingList.apply_recipe_change(obj.recipe_id, amounts, {})
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        ShoppingList.apply_recipe_change(
+            obj.recipe_id, {}, {obj.ingredient_id: obj.amount})
+        super().delete_model(request, obj)
+        self.recipes_changed((obj.recipe_id,))
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        recipe_ids = []
+        for recipe_ingredient in queryset:
+            ShoppingList.apply_recipe_change(
+                recipe_ingredient.recipe_id, {},
+                {recipe_ingredient.ingredient_id: recipe_ingredient.amount})
+            recipe_ids.append(recipe_ingredient.recipe_id)
+        super().delete_queryset(request, queryset)
+        self.recipes_changed(recipe_ids)
+
+
+class BaseFavoriteShoppingCartAdmin(admin.ModelAdmin):
+    """Базовая админ-зона Избранного и Корзины."""
+    search_fields = (
+        'recipe__name',
+        'user__username',
+    )
+    autocomplete_fields = (
+        'recipe',
+        'user',
+    )
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'user')
+
+    def added(self, user_id, recipe_id):
+        """Изменения при добавлении Рецепта в список."""
+        change_counter(
+            Recipe, recipe_id, self.model.recipe_counter, 1,
+            interactions_changed_at=timezone.now())
+
+    def removed(self, user_id, recipe_id):
+        """Изменения при удалении Рецепта из списка."""
+        change_counter(
+            Recipe, recipe_id, self.model.recipe_counter, -1,
+            interactions_changed_at=timezone.now())
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        previous = type(obj).objects.filter(pk=obj.pk).values_list(
+            'user_id', 'recipe_id').first()
+        super().save_model(request, obj, form, change)
+        if previous != (obj.user_id, obj.recipe_id):
+            if previous is not None:
+                self.removed(*previous)
+            self.added(obj.user_id, obj.recipe_id)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.removed(obj.user_id, obj.recipe_id)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset.values_list('user_id', 'recipe_id'))
+        super().delete_queryset(request, queryset)
+        for user_id, recipe_id in rows:
+            self.removed(user_id, recipe_id)
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(BaseFavoriteShoppingCartAdmin):
     """Админ-зона Избранного."""
     list_display = (
         'id',
         'recipe',
         'user',
     )
-    search_fields = (
-        'recipe',
-    )
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(BaseFavoriteShoppingCartAdmin):
     """Админ-зона Корзины."""
     list_display = (
         'id',
         'user',
         'recipe',
     )
+
+    def added(self, user_id, recipe_id):
+        super().added(user_id, recipe_id)
+        ShoppingList.apply(
+            (user_id,), ShoppingList.recipe_amounts(recipe_id))
+
+    def removed(self, user_id, recipe_id):
+        super().removed(user_id, recipe_id)
+        ShoppingList.apply(
+            (user_id,), ShoppingList.recipe_amounts(recipe_id), -1)
+
+
+@admin.register(ShoppingList)
+class ShoppingListAdmin(admin.ModelAdmin):
+    """Админ-зона Списков покупок."""
+    list_display = (
+        'id',
+        'user',
+        'ingredient',
+        'amount',
+    )
     search_fields = (
-        'recipe',
+        'user__username',
+        'ingredient__name',
+    )
+    autocomplete_fields = (
+        'user',
+        'ingredient',
     )
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'user', 'ingredient')
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    "CREATE INDEX IF NOT EXISTS recipes_recipe_search_idx "
+    "ON recipes_recipe USING gin (to_tsvector('russian', "
+    "coalesce(name, '') || ' ' || coalesce(text, '')))",
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_name_trgm_idx '
+    'ON recipes_recipe USING gin (name gin_trgm_ops)',
+)
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_idx',
+    'DROP INDEX IF EXISTS recipes_recipe_name_trgm_idx',
+)
+SQLITE_FORWARD = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5("
+    "name, text, content='recipes_recipe', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert "
+    "AFTER INSERT ON recipes_recipe BEGIN "
+    "INSERT INTO recipes_recipe_fts(rowid, name, text) "
+    "VALUES (new.id, new.name, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete "
+    "AFTER DELETE ON recipes_recipe BEGIN "
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update "
+    "AFTER UPDATE ON recipes_recipe BEGIN "
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) "
+    "VALUES ('delete', old.id, old.name, old.text); "
+    "INSERT INTO recipes_recipe_fts(rowid, name, text) "
+    "VALUES (new.id, new.name, new.text); END",
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')",
+)
+SQLITE_BACKWARD = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor not in statements:
+            return
+        for sql in statements[vendor]:
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppinglist'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
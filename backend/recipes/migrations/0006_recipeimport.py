@@ -0,0 +1,26 @@
+# Generated by Django 3.2 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(max_length=64, unique=True, verbose_name='Контрольная сумма файла')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='Обработано строк')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Импорт рецептов',
+                'verbose_name_plural': 'Импорты рецептов',
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2 on 2026-10-18 05:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+BACKFILL_SIZE = 100
+BATCH_SIZE = 5000
+
+
+def fill_feeds(apps, schema_editor):
+    """Заполняет ленты последними Рецептами авторов из подписок."""
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('users', 'Subscription')
+    latest = {}
+    entries = []
+    for user_id, author_id in Subscription.objects.values_list(
+            'user_id', 'author_id'):
+        if author_id not in latest:
+            latest[author_id] = list(Recipe.objects.filter(
+                author_id=author_id).order_by('-pub_date', '-id').values_list(
+                'id', 'pub_date')[:BACKFILL_SIZE])
+        entries.extend(
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in latest[author_id]
+        )
+        if len(entries) >= BATCH_SIZE:
+            FeedEntry.objects.bulk_create(entries)
+            entries = []
+    FeedEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+                'ordering': ('-pub_date', '-id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-id'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_feed'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
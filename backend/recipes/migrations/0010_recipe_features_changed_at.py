@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='features_changed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата изменения ингредиентов и тегов'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 06:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_features_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='feed_pending',
+            field=models.BooleanField(db_index=True, default=False, verbose_name='Ожидает рассылки в ленты'),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Greatest
 from django.core.validators import MinValueValidator
 from colorfield.fields import ColorField
 
@@ -11,6 +13,24 @@ from foodgram.constants import (
 )
 
 
+def change_counter(model, pk, field, delta, **changes):
+    """Атомарно изменяет счетчик объекта на delta, не опуская ниже нуля."""
+    change_counters(model, (pk,), field, delta, **changes)
+
+
+def change_counters(model, pks, field, delta, **changes):
+    """Изменяет счетчик сразу у нескольких объектов одним запросом.
+
+    changes - другие поля, которые обновляются тем же запросом.
+    """
+    if not pks:
+        return
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta}, **changes)
+
+
 class Ingredient(models.Model):
     """Модель Ингредиентов."""
     name = models.CharField(
@@ -94,11 +114,21 @@ class Recipe(models.Model):
         blank=True,
         verbose_name='Фото'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Уменьшенные копии фото'
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
         db_index=True,
         verbose_name='Дата создания рецепта',
     )
+    feed_pending = models.BooleanField(
+        default=False,
+        db_index=True,
+        verbose_name='Ожидает рассылки в ленты'
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipeIngredient',
@@ -111,6 +141,30 @@ class Recipe(models.Model):
         Tag,
         verbose_name='Теги'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число добавлений в избранное'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число добавлений в корзину'
+    )
+    interactions_changed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата изменения Избранного и Корзин'
+    )
+    features_changed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата изменения ингредиентов и тегов'
+    )
+    similar_computed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Дата расчета похожих рецептов'
+    )
 
     class Meta:
         ordering = ('name',)
@@ -178,6 +232,8 @@ class BaseFovoriteShoppingCart(models.Model):
 
 class Favorite(BaseFovoriteShoppingCart):
     """Модель Избранного."""
+    recipe_counter = 'favorites_count'
+
     class Meta:
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
@@ -195,6 +251,8 @@ class Favorite(BaseFovoriteShoppingCart):
 
 class ShoppingCart(BaseFovoriteShoppingCart):
     """Модель Корзины."""
+    recipe_counter = 'in_carts_count'
+
     class Meta:
         verbose_name = 'Корзина для покупок'
         verbose_name_plural = 'Корзины для покупок'
@@ -209,3 +267,211 @@ class ShoppingCart(BaseFovoriteShoppingCart):
     def __str__(self):
         return (f'Пользователь "{self.user.username}" '
                 f'добавил {self.recipe} в Корзину')
+
+
+class RecipeImport(models.Model):
+    """Прогресс импорта Рецептов из файла.
+
+    Обновляется в одной транзакции с каждой пачкой Рецептов, поэтому
+    повторный запуск импорта продолжает его без дублирования записей.
+    """
+    checksum = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Контрольная сумма файла'
+    )
+    processed = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Обработано строк'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата обновления'
+    )
+
+    class Meta:
+        verbose_name = 'Импорт рецептов'
+        verbose_name_plural = 'Импорты рецептов'
+
+    def __str__(self):
+        return f'{self.checksum[:12]}: {self.processed}'
+
+
+class ShoppingList(models.Model):
+    """Агрегированный список покупок Пользователя.
+
+    Хранит суммарное количество каждого ингредиента по всем рецептам
+    в Корзине и обновляется при изменении Корзины и Рецептов в ней.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Общее количество'
+    )
+
+    class Meta:
+        ordering = ('ingredient__name',)
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_shopping_list'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient}: {self.amount}'
+
+    @staticmethod
+    def recipe_amounts(recipe_id):
+        """Количество каждого ингредиента в Рецепте."""
+        return dict(RecipeIngredient.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient_id', 'amount'))
+
+    @staticmethod
+    def recipes_amounts(recipe_ids):
+        """Суммарное количество каждого ингредиента в нескольких Рецептах."""
+        return dict(RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids).order_by().values(
+            'ingredient_id').annotate(total=Sum('amount')).values_list(
+            'ingredient_id', 'total'))
+
+    @classmethod
+    def apply(cls, user_ids, amounts, sign=1):
+        """Прибавляет (sign=1) или вычитает (sign=-1) количества
+        ингредиентов {ingredient_id: amount} в списках Пользователей."""
+        amounts = {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        user_ids = list(user_ids)
+        if not amounts or not user_ids:
+            return
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, ingredient_id=ingredient_id, amount=0)
+                 for user_id in user_ids
+                 for ingredient_id, amount in amounts.items() if amount > 0],
+                ignore_conflicts=True
+            )
+            items = cls.objects.filter(
+                user_id__in=user_ids, ingredient_id__in=amounts)
+            items.update(amount=Greatest(F('amount') + Case(
+                *[When(ingredient_id=ingredient_id, then=Value(amount))
+                  for ingredient_id, amount in amounts.items()],
+                default=Value(0),
+                output_field=models.IntegerField()
+            ), 0))
+            items.filter(amount__lte=0).delete()
+
+    @classmethod
+    def apply_recipe_change(cls, recipe_id, amounts, current_amounts):
+        """Переносит изменение ингредиентов Рецепта с current_amounts
+        на amounts в списки покупок Пользователей, у которых Рецепт
+        лежит в Корзине."""
+        amounts = dict(amounts)
+        for ingredient_id, amount in current_amounts.items():
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) - amount
+        cls.apply(
+            ShoppingCart.objects.filter(
+                recipe_id=recipe_id).values_list('user_id', flat=True),
+            amounts
+        )
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок Пользователя.
+
+    Лента заполняется при публикации Рецепта и при подписке, поэтому
+    чтение ленты не соединяет Подписки с Рецептами. Дата публикации
+    дублируется для сортировки по индексу ленты.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user_recipe_feed'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-id'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    """Похожий Рецепт из предрассчитанного списка соседей.
+
+    Списки строит команда build_similar_recipes по совместному
+    добавлению в Избранное и Корзину и общим ингредиентам и тегам.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        ordering = ('recipe', '-score')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similar'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
@@ -0,0 +1,124 @@
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from api.tests.base import FoodgramTestCase
+from recipes.models import Favorite, Recipe, ShoppingCart, ShoppingList
+from users.models import User
+
+
+class CountersTests(FoodgramTestCase):
+    """Счетчики Избранного, Корзин и Рецептов меняются вместе с данными."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(amounts={self.ingredients[0]: 100})
+
+    def counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        return recipe.favorites_count, recipe.in_carts_count
+
+    def recipes_count(self, user):
+        return User.objects.get(pk=user.pk).recipes_count
+
+    def test_favorite_and_cart(self):
+        self.client.force_authenticate(self.user)
+        for kind in ('favorite', 'shopping_cart'):
+            self.client.post(f'/api/recipes/{self.recipe.id}/{kind}/')
+            self.client.post(f'/api/recipes/{self.recipe.id}/{kind}/')
+        self.assertEqual(self.counters(), (1, 1))
+        self.assertIsNotNone(
+            Recipe.objects.get(pk=self.recipe.pk).interactions_changed_at)
+        for kind in ('favorite', 'shopping_cart'):
+            self.client.delete(f'/api/recipes/{self.recipe.id}/{kind}/')
+            self.client.delete(f'/api/recipes/{self.recipe.id}/{kind}/')
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_recipe_create_and_delete(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(
+            '/api/recipes/', self.recipe_payload(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.recipes_count(self.author), 1)
+        self.client.delete(f'/api/recipes/{response.json()["id"]}/')
+        self.assertEqual(self.recipes_count(self.author), 0)
+
+    def test_recount_fixes_drift(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=5)
+        with self.assertRaises(CommandError):
+            call_command('recount_counters', '--check', stdout=StringIO())
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 0))
+        self.assertEqual(self.recipes_count(self.author), 1)
+        call_command('recount_counters', '--check', stdout=StringIO())
+
+
+class CountersAdminTests(FoodgramTestCase):
+    """Изменения из админ-зоны меняют счетчики, как и API."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(amounts={self.ingredients[0]: 100})
+        User.objects.filter(pk=self.author.pk).update(recipes_count=1)
+        admin = self.create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+
+    def test_favorite_add_and_delete(self):
+        response = self.client.post(
+            '/admin/recipes/favorite/add/',
+            {'user': self.user.id, 'recipe': self.recipe.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).favorites_count, 1)
+        self.client.post('/admin/recipes/favorite/', {
+            'action': 'delete_selected',
+            '_selected_action': Favorite.objects.values_list(
+                'pk', flat=True),
+            'post': 'yes',
+        })
+        self.assertFalse(Favorite.objects.exists())
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).favorites_count, 0)
+
+    def test_cart_add_fills_shopping_list(self):
+        self.client.post(
+            '/admin/recipes/shoppingcart/add/',
+            {'user': self.user.id, 'recipe': self.recipe.id})
+        self.assertTrue(ShoppingCart.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).in_carts_count, 1)
+        self.assertEqual(
+            list(ShoppingList.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'amount')),
+            [(self.ingredients[0].id, 100)])
+
+    def test_recipe_author_change(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image=default_storage.save(
+                'recipes/images/a.png', ContentFile(b'image')))
+        url = f'/admin/recipes/recipe/{self.recipe.id}/change/'
+        form = self.client.get(url).context['adminform'].form
+        data = {
+            name: form[name].value() for name in form.fields
+            if name != 'image' and form[name].value() is not None
+        }
+        recipe_ingredient = self.recipe.recipes.get()
+        response = self.client.post(url, {
+            **data,
+            'author': self.other.id,
+            'recipes-TOTAL_FORMS': 1,
+            'recipes-INITIAL_FORMS': 1,
+            'recipes-0-id': recipe_ingredient.id,
+            'recipes-0-recipe': self.recipe.id,
+            'recipes-0-ingredient': self.ingredients[0].id,
+            'recipes-0-amount': 100,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).recipes_count, 0)
+        self.assertEqual(
+            User.objects.get(pk=self.other.pk).recipes_count, 1)
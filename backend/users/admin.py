@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
 
+from api.feed import backfill, trim
+from recipes.models import change_counter
 from users.models import Subscription, User
 
 
@@ -20,17 +23,20 @@ class UserAdmin(admin.ModelAdmin):
         'email',
     )
     list_filter = (
-        'username',
-        'email',
+        'is_staff',
+        'is_active',
     )
+    show_full_result_count = False
 
-    @admin.display(description='Кол-во подписчиков')
+    @admin.display(description='Кол-во подписчиков',
+                   ordering='followers_count')
     def get_subscribe_count(self, obj):
-        return obj.subscribed_to.count()
+        return obj.followers_count
 
-    @admin.display(description='Кол-во рецептов')
+    @admin.display(description='Кол-во рецептов',
+                   ordering='recipes_count')
     def get_recipe_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
 
 @admin.register(Subscription)
@@ -41,3 +47,50 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'user',
         'author',
     )
+    search_fields = (
+        'user__username',
+        'author__username',
+    )
+    autocomplete_fields = (
+        'user',
+        'author',
+    )
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'user', 'author')
+
+    @staticmethod
+    def subscribed(subscription):
+        """Те же изменения, что и при подписке через API."""
+        change_counter(User, subscription.author_id, 'followers_count', 1)
+        backfill(subscription.user, subscription.author)
+
+    @staticmethod
+    def unsubscribed(user_id, author_id):
+        change_counter(User, author_id, 'followers_count', -1)
+        trim(user_id, author_id)
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        previous = None
+        if change:
+            previous = (form.initial['user'], form.initial['author'])
+        super().save_model(request, obj, form, change)
+        if previous != (obj.user_id, obj.author_id):
+            if previous is not None:
+                self.unsubscribed(*previous)
+            self.subscribed(obj)
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.unsubscribed(obj.user_id, obj.author_id)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        rows = list(queryset.values_list('user_id', 'author_id'))
+        super().delete_queryset(request, queryset)
+        for user_id, author_id in rows:
+            self.unsubscribed(user_id, author_id)
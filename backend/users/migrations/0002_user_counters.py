@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 05:24
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    Subscription = apps.get_model('users', 'Subscription')
+    apps.get_model('users', 'User').objects.update(
+        followers_count=Coalesce(Subquery(
+            Subscription.objects.filter(author=OuterRef('pk')).order_by(
+            ).values('author').annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'ordering': ('username',), 'verbose_name': 'Пользователь', 'verbose_name_plural': 'Пользователи'},
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+    ]
@@ -40,6 +40,14 @@ class User(AbstractUser):
         default=False,
         verbose_name='Подписан'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 
@@ -78,7 +86,7 @@ class Subscription(models.Model):
         if self.user == self.author:
             raise ValidationError('Запрещено подписываться на самого себя!')
 
-        if Subscription.objects.filter(user=self.user,
-                                       author=self.author).exists():
+        if Subscription.objects.filter(
+                user=self.user,
+                author=self.author).exclude(pk=self.pk).exists():
             raise ValidationError(f'Вы уже подписаны на "{self.author}"!')
-        super().save()
@@ -0,0 +1,146 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import FoodgramTestCase
+from recipes.models import FeedEntry
+from users.models import Subscription, User
+
+
+class SubscriptionAdminTests(FoodgramTestCase):
+    """Подписки из админ-зоны меняют счетчики и ленты, как и API."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = self.create_user('admin', is_staff=True,
+                                      is_superuser=True)
+        self.client.force_login(self.admin)
+        self.recipe = self.create_recipe(author=self.author)
+
+    def followers(self, user):
+        return User.objects.get(pk=user.pk).followers_count
+
+    def test_add_subscription(self):
+        response = self.client.post(
+            '/admin/users/subscription/add/',
+            {'user': self.user.id, 'author': self.author.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.followers(self.author), 1)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user, recipe=self.recipe).exists())
+
+    def test_duplicate_subscription_is_rejected(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        response = self.client.post(
+            '/admin/users/subscription/add/',
+            {'user': self.user.id, 'author': self.author.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Subscription.objects.count(), 1)
+
+    def test_change_author(self):
+        self.client.post(
+            '/admin/users/subscription/add/',
+            {'user': self.user.id, 'author': self.author.id})
+        subscription = Subscription.objects.get()
+        response = self.client.post(
+            f'/admin/users/subscription/{subscription.id}/change/',
+            {'user': self.user.id, 'author': self.other.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.followers(self.author), 0)
+        self.assertEqual(self.followers(self.other), 1)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    def test_save_without_changes_keeps_counter(self):
+        self.client.post(
+            '/admin/users/subscription/add/',
+            {'user': self.user.id, 'author': self.author.id})
+        subscription = Subscription.objects.get()
+        self.client.post(
+            f'/admin/users/subscription/{subscription.id}/change/',
+            {'user': self.user.id, 'author': self.author.id})
+        self.assertEqual(self.followers(self.author), 1)
+
+    def test_delete_selected(self):
+        for user in (self.user, self.other):
+            self.client.post(
+                '/admin/users/subscription/add/',
+                {'user': user.id, 'author': self.author.id})
+        response = self.client.post('/admin/users/subscription/', {
+            'action': 'delete_selected',
+            '_selected_action': Subscription.objects.values_list(
+                'id', flat=True),
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.followers(self.author), 0)
+        self.assertFalse(FeedEntry.objects.exists())
+
+
+class SubscriptionsTests(FoodgramTestCase):
+    """Подписки через API и страница подписок."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        for name in ('Вареники', 'Блины', 'Борщ'):
+            self.create_recipe(author=self.author, name=name)
+        self.create_recipe(author=self.other, name='Каша')
+        call_command('recount_counters', stdout=StringIO())
+
+    def subscribe(self, author):
+        return self.client.post(f'/api/users/{author.id}/subscribe/')
+
+    def test_subscribe_and_unsubscribe(self):
+        response = self.subscribe(self.author)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['is_subscribed'])
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).followers_count, 1)
+        self.assertEqual(self.subscribe(self.author).status_code, 400)
+        response = self.client.delete(
+            f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).followers_count, 0)
+
+    def test_subscribe_to_self_is_rejected(self):
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.subscribe(self.author).status_code, 400)
+
+    def test_recipes_limit(self):
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': 2})
+        authors = {
+            author['id']: author for author in response.json()['results']}
+        author = authors[self.author.id]
+        self.assertTrue(author['is_subscribed'])
+        self.assertEqual(author['recipes_count'], 3)
+        self.assertEqual([recipe['name'] for recipe in author['recipes']],
+                         ['Блины', 'Борщ'])
+        self.assertEqual(len(authors[self.other.id]['recipes']), 1)
+
+    def test_queries_do_not_grow_with_authors(self):
+        self.subscribe(self.author)
+        counts = []
+        for username in ('first', 'second'):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(
+                    '/api/users/subscriptions/', {'recipes_limit': 2})
+            counts.append(len(queries))
+            author = self.create_user(username)
+            self.create_recipe(author=author)
+            Subscription.objects.create(user=self.user, author=author)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_embedded_authors_are_subscribed(self):
+        self.subscribe(self.author)
+        response = self.client.get('/api/recipes/')
+        subscribed = {
+            recipe['author']['id']: recipe['author']['is_subscribed']
+            for recipe in response.json()['results']}
+        self.assertEqual(
+            subscribed, {self.author.id: True, self.other.id: False})
@@ -1,3 +1,6 @@
+from django.db import transaction
+from django.db.models import BooleanField, F, Value, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
@@ -10,15 +13,19 @@ from api.serializers import (
     SetPasswordSerializer,
     SubscriptionSerializer,
 )
-from api.paginations import CustomPagination
+from api.feed import backfill, trim
+from api.paginations import CustomCursorPagination
+from foodgram.instrumentation import SerializerMetricsMixin, measured
 
+from recipes.models import Recipe, change_counter
 from users.models import User, Subscription
 
 
-class UsersViewSet(viewsets.ModelViewSet):
+class UsersViewSet(SerializerMetricsMixin, viewsets.ModelViewSet):
     """ViewSet для Пользователя."""
     queryset = User.objects.all()
-    pagination_class = CustomPagination
+    pagination_class = CustomCursorPagination
+    cursor_ordering = ('username', 'id')
     permission_classes = (AllowAny,)
 
     def get_serializer_class(self):
@@ -31,7 +38,7 @@ class UsersViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,))
     def me(self, request):
         """Просмотр своего профиля."""
-        serializer = CustomUserReadSerializer(request.user)
+        serializer = measured(CustomUserReadSerializer(request.user))
         return Response(serializer.data)
 
     @action(methods=['post'],
@@ -50,14 +57,46 @@ class UsersViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         """Просмотр своих подписок."""
-        subscribed_by = User.objects.filter(subscribed_by__user=request.user)
+        subscribed_by = User.objects.filter(
+            subscribed_by__user=request.user
+        ).annotate(
+            subscribed=Value(True, output_field=BooleanField()),
+        )
         pages = self.paginate_queryset(subscribed_by)
-        serializer = SubscriptionSerializer(
+        self.attach_recipes(pages, request.GET.get('recipes_limit'))
+        serializer = measured(SubscriptionSerializer(
             pages,
             many=True,
-            context={'request': request})
+            context={'request': request}))
         return self.get_paginated_response(serializer.data)
 
+    @staticmethod
+    def attach_recipes(authors, limit):
+        """Вспомогательный метод загрузки Рецептов авторов одним запросом.
+
+        При заданном лимите первые рецепты каждого автора выбираются
+        оконной функцией ROW_NUMBER с разбиением по автору.
+        """
+        if not authors:
+            return
+        recipes = Recipe.objects.filter(author__in=authors)
+        if limit:
+            ranked = recipes.annotate(row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('name').asc(), F('id').asc()),
+            ))
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                f'WHERE row_number <= %s ORDER BY name, id',
+                (*params, int(limit)))
+        recipes_by_author = {author.id: [] for author in authors}
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.recipes_preview = recipes_by_author[author.id]
+
     @action(methods=['post'],
             detail=True,
             permission_classes=(IsAuthenticated,))
@@ -75,12 +114,15 @@ class UsersViewSet(viewsets.ModelViewSet):
             return Response(
                 {'errors': f'Вы уже подписаны на "{author}"'},
                 status=status.HTTP_400_BAD_REQUEST)
-        serializer = SubscriptionSerializer(
+        serializer = measured(SubscriptionSerializer(
             author,
             data=request.data,
-            context={'request': request})
+            context={'request': request}))
         serializer.is_valid(raise_exception=True)
-        Subscription.objects.create(user=request.user, author=author)
+        with transaction.atomic():
+            Subscription.objects.create(user=request.user, author=author)
+            change_counter(User, author.id, 'followers_count', 1)
+            backfill(request.user, author)
         return Response(
             serializer.data,
             status=status.HTTP_201_CREATED)
@@ -101,7 +143,10 @@ class UsersViewSet(viewsets.ModelViewSet):
             user=request.user,
             author=author
         )
-        delete_subscribe.delete()
+        with transaction.atomic():
+            delete_subscribe.delete()
+            change_counter(User, author.id, 'followers_count', -1)
+            trim(request.user, author)
         return Response(
             {'detail': f'Вы отписались от "{author}".'},
             status=status.HTTP_204_NO_CONTENT)